@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic fleet for benchmarks.
+
+Writes golden templates and device snapshots in the same layouts as
+``supreme_golden_cfg/`` and ``snapshots/``: M expected categories (one
+banner category plus block templates), F forbidden categories (three named
+ones, then synthetic ones), and N devices per snapshot. Devices are padded
+with interface boilerplate to the requested size; ``drift`` is the share of
+devices that miss a required block, carry a forbidden line, or change
+between consecutive snapshots. A given seed always writes the same files.
+
+Usage:
+    python -m benchmarks.generate_fleet /tmp/fleet --devices 2000 --lines 3000
+    python -m benchmarks.generate_fleet /tmp/fleet --categories 50 --forbidden-categories 50
+"""
+import os
+import random
+import argparse
+from datetime import datetime, timedelta, timezone
+
+FORBIDDEN_LINES = {
+    'debug': ['debug all', 'debug bgp', 'debug ospf events'],
+    'features': ['feature telnet', 'feature bash', 'feature http-server'],
+    'protocols': ['telnet server enable', 'http server enable', 'ip http server'],
+}
+
+BANNER = ['banner motd ^C', 'Authorized access only', 'All activity is logged', '^C']
+
+FIRST_SNAPSHOT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _category_block(rng, category):
+    """Template block of one synthetic expected category (flat, so text and tree matching agree)."""
+    children = [f"{category}-option {n} value {rng.randint(1, 999)}" for n in range(rng.randint(2, 5))]
+    return [f"{category} profile CORPORATE"] + children + [f"{category} enable"]
+
+
+def _forbidden_lines(rng, categories):
+    """{category: lines} of ``categories`` forbidden categories, the named ones first."""
+    forbidden = dict(list(FORBIDDEN_LINES.items())[:categories])
+    for n in range(len(forbidden), categories):
+        category = f"fcat{n:03d}"
+        forbidden[category] = [f"{category}-legacy-command {m} {rng.randint(1, 999)}" for m in range(1, 4)]
+    return forbidden
+
+
+def generate_templates(out_dir, rng, categories, forbidden_categories=len(FORBIDDEN_LINES)):
+    """Write expected/forbidden fragments; returns ({category: lines}, {category: lines})."""
+    expected = {'banners': BANNER}
+    for n in range(1, categories):
+        expected[f"cat{n:03d}"] = _category_block(rng, f"cat{n:03d}")
+    forbidden = _forbidden_lines(rng, forbidden_categories)
+
+    for kind, templates in (('expected', expected), ('forbidden', forbidden)):
+        base = os.path.join(out_dir, 'supreme_golden_cfg', f'{kind}_Q1', 'fragments')
+        for category, lines in templates.items():
+            os.makedirs(os.path.join(base, category), exist_ok=True)
+            if kind == 'forbidden':
+                for n, line in enumerate(lines, 1):
+                    _write(os.path.join(base, category, f"{category}-{n:02d}.cfg"), [line])
+            else:
+                _write(os.path.join(base, category, f"{category}-corporate.cfg"), lines)
+    return expected, forbidden
+
+
+def device_config(rng, name, expected, forbidden, lines, drift):
+    """Config lines of one device of roughly ``lines`` lines."""
+    config = ['! Synthetic configuration', 'version 9.3(10)', f"hostname {name}", '!']
+    for category, block in expected.items():
+        if rng.random() < drift:
+            continue  # Missing required block
+        config.extend(block)
+        config.append('!')
+    for category_lines in forbidden.values():
+        if forbidden and rng.random() < drift / len(forbidden):
+            config.append(rng.choice(category_lines))
+
+    port = 1
+    while len(config) < lines:
+        config.extend([
+            f"interface Ethernet1/{port}",
+            f"  description {name}-port-{port}",
+            '  switchport mode trunk',
+            '  mtu 9216',
+            '  no shutdown',
+            '!',
+        ])
+        port += 1
+    return config
+
+
+def generate_fleet(out_dir, devices=100, lines=500, drift=0.05, categories=6, snapshots=2, seed=0,
+                   forbidden_categories=len(FORBIDDEN_LINES)):
+    """Generate templates and ``snapshots`` snapshot directories; returns their names."""
+    rng = random.Random(seed)
+    expected, forbidden = generate_templates(out_dir, rng, categories, forbidden_categories)
+
+    configs = {
+        f"dev{n:05d}": device_config(rng, f"dev{n:05d}", expected, forbidden, lines, drift)
+        for n in range(devices)
+    }
+
+    names = []
+    for index in range(snapshots):
+        if index:
+            # Drift: a share of devices get a few lines changed in each snapshot
+            for device in rng.sample(sorted(configs), int(devices * drift)):
+                config = configs[device]
+                for _ in range(rng.randint(1, 3)):
+                    config[rng.randrange(4, len(config))] = f"  description changed-{index}-{rng.randint(0, 9999)}"
+
+        name = (FIRST_SNAPSHOT + timedelta(hours=index)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        snapshot_dir = os.path.join(out_dir, 'snapshots', name)
+        os.makedirs(snapshot_dir, exist_ok=True)
+        for device, config in configs.items():
+            _write(os.path.join(snapshot_dir, f"{device}.cfg"), config)
+        names.append(name)
+    return names
+
+
+def _write(path, lines):
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic fleet for benchmarks')
+    parser.add_argument('out_dir', help='Output directory (gets supreme_golden_cfg/ and snapshots/)')
+    parser.add_argument('--devices', type=int, default=100, help='Devices per snapshot (default: 100)')
+    parser.add_argument('--lines', type=int, default=500, help='Approximate lines per device (default: 500)')
+    parser.add_argument('--drift', type=float, default=0.05,
+                        help='Share of non-compliant/changed devices, 0-1 (default: 0.05)')
+    parser.add_argument('--categories', type=int, default=6,
+                        help='Expected template categories, including banners (default: 6)')
+    parser.add_argument('--forbidden-categories', type=int, default=len(FORBIDDEN_LINES),
+                        help=f'Forbidden template categories (default: {len(FORBIDDEN_LINES)})')
+    parser.add_argument('--snapshots', type=int, default=2, help='Number of snapshots (default: 2)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    args = parser.parse_args()
+
+    names = generate_fleet(args.out_dir, args.devices, args.lines, args.drift,
+                           args.categories, args.snapshots, args.seed, args.forbidden_categories)
+    print(f"# {args.out_dir}: {args.devices} devices x {len(names)} snapshots ({names[0]} .. {names[-1]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+End-to-end timing of the compliance pipeline on a synthetic fleet.
+
+Times each stage separately: golden template loading (cold and from the
+bundle cache), snapshot discovery, every category test as run by its test
+module, the single-pass runner, CSV reporting and compare_snapshots.py
+(line and semantic diff). Results are written as JSON, so runs can be
+compared with --baseline.
+
+Usage:
+    python -m benchmarks.run_benchmarks --devices 2000 --lines 3000
+    python -m benchmarks.run_benchmarks --fleet /tmp/fleet --baseline old.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+from datetime import datetime
+
+from benchmarks.generate_fleet import generate_fleet
+from tests.common.config_utils import (
+    find_latest_snapshot_dir, collect_device_configs, DeviceStore, write_csv_report
+)
+from tests.common.golden_bundle import GoldenBundle, load_golden_bundle
+from tests.common.engine import ComplianceEngine
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fleet_config(fleet_dir, work_dir, mode='strict', match='text'):
+    """test_config dict (see get_config()) pointing at a generated fleet."""
+    return {
+        'snapshots_base': os.path.join(fleet_dir, 'snapshots'),
+        'snap_ts': None,
+        'expected_dir': os.path.join(fleet_dir, 'supreme_golden_cfg', 'expected_Q1', 'fragments'),
+        'forbidden_dir': os.path.join(fleet_dir, 'supreme_golden_cfg', 'forbidden_Q1', 'fragments'),
+        'cache_dir': os.path.join(work_dir, 'cache'),
+        'result_cache': False,
+        'mode': mode,
+        'match': match,
+        'csv_output': True,
+        'results_dir': os.path.join(work_dir, 'results'),
+        'print_csv': False,
+        'mmap_threshold': None,
+        'workers': 1,
+        'result_sink': None,
+    }
+
+
+def timed(repeat, func, setup=None):
+    """Run func() ``repeat`` times; returns ({min, mean, runs}, last result).
+
+    ``setup()`` runs untimed before each run and its result is passed to func.
+    """
+    runs = []
+    result = None
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        result = func(arg) if setup else func()
+        runs.append(time.perf_counter() - start)
+    return {'min': min(runs), 'mean': sum(runs) / len(runs), 'runs': runs}, result
+
+
+def run_category(engine, device_configs, kind, category):
+    """What one generated test module does: evaluate a category for every device."""
+    rows = []
+    for _, config in DeviceStore(device_configs).items():
+        category_rows, _ = engine.evaluate(kind, category, config)
+        rows.extend(category_rows)
+    return rows
+
+
+def run_benchmarks(test_config, repeat=3, workers=1):
+    """Time every stage; returns {stage: timing}."""
+    stages = {}
+    expected_dir, forbidden_dir = test_config['expected_dir'], test_config['forbidden_dir']
+
+    stages['template_loading'], _ = timed(repeat, lambda: GoldenBundle(expected_dir, forbidden_dir))
+    load_golden_bundle(expected_dir, forbidden_dir, test_config['cache_dir'])
+    stages['template_loading_cached'], _ = timed(
+        repeat, lambda: load_golden_bundle(expected_dir, forbidden_dir, test_config['cache_dir'])
+    )
+
+    def discover():
+        return collect_device_configs(find_latest_snapshot_dir(test_config['snapshots_base']))
+    stages['snapshot_discovery'], device_configs = timed(repeat, discover)
+
+    engine = ComplianceEngine(test_config)
+    for kind, category in engine.iter_categories():
+        # Fresh engine per run: each category test pays for its own scans
+        stages[f"category/{kind}/{category}"], _ = timed(
+            repeat, lambda fresh: run_category(fresh, device_configs, kind, category),
+            setup=lambda: ComplianceEngine(test_config)
+        )
+
+    stages['single_pass_run'], _ = timed(
+        repeat, lambda fresh: fresh.run(device_configs, workers), setup=lambda: ComplianceEngine(test_config)
+    )
+
+    rows = []
+    for kind, category in engine.iter_categories():
+        rows.extend(run_category(engine, device_configs, kind, category))
+    stages['csv_report'], _ = timed(repeat, lambda: write_csv_report(test_config, rows))
+
+    snapshots = sorted(os.listdir(test_config['snapshots_base']))
+    if len(snapshots) > 1:
+        for name, extra in (('compare_snapshots', []), ('compare_snapshots_semantic', ['--semantic'])):
+            command = [sys.executable, os.path.join(REPO_ROOT, 'compare_snapshots.py'),
+                       '--snapshots-dir', test_config['snapshots_base'],
+                       '--snapshot-a', snapshots[0], '--snapshot-b', snapshots[-1]] + extra
+            stages[name], _ = timed(repeat, lambda: subprocess.run(
+                command, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, check=True
+            ))
+
+    return stages
+
+
+def print_table(stages, baseline=None):
+    """Print stage timings, with the change against a baseline run when given."""
+    base_stages = baseline['stages'] if baseline else {}
+    width = max(len(name) for name in stages)
+    for name, timing in stages.items():
+        line = f"{name:<{width}}  {timing['min'] * 1000:10.1f} ms"
+        if name in base_stages:
+            line += f"  ({timing['min'] / base_stages[name]['min']:.2f}x baseline)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compliance pipeline on a synthetic fleet')
+    parser.add_argument('--fleet', default=None,
+                        help='Existing fleet directory (from benchmarks.generate_fleet); '
+                             'default: generate one in a temp directory')
+    parser.add_argument('--devices', type=int, default=200, help='Devices to generate (default: 200)')
+    parser.add_argument('--lines', type=int, default=1000, help='Lines per device (default: 1000)')
+    parser.add_argument('--drift', type=float, default=0.05, help='Drift rate (default: 0.05)')
+    parser.add_argument('--categories', type=int, default=6, help='Expected categories (default: 6)')
+    parser.add_argument('--forbidden-categories', type=int, default=3, help='Forbidden categories (default: 3)')
+    parser.add_argument('--seed', type=int, default=0, help='Generator seed (default: 0)')
+    parser.add_argument('--drift-mode', default='strict', choices=['strict', 'loose'])
+    parser.add_argument('--drift-match', default='text', choices=['text', 'tree'])
+    parser.add_argument('--workers', type=int, default=1, help='Workers for the single-pass run (default: 1)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; the minimum is reported')
+    parser.add_argument('--output', default=None,
+                        help='JSON results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=None, help='Previous JSON results to compare against')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='cfg_drift_bench_')
+    try:
+        fleet_dir = args.fleet
+        if fleet_dir is None:
+            fleet_dir = os.path.join(work_dir, 'fleet')
+            generate_fleet(fleet_dir, args.devices, args.lines, args.drift, args.categories, seed=args.seed,
+                           forbidden_categories=args.forbidden_categories)
+
+        test_config = fleet_config(fleet_dir, work_dir, args.drift_mode, args.drift_match)
+        stages = run_benchmarks(test_config, args.repeat, args.workers)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'fleet': args.fleet,
+            'devices': args.devices,
+            'lines': args.lines,
+            'drift': args.drift,
+            'categories': args.categories,
+            'forbidden_categories': args.forbidden_categories,
+            'seed': args.seed,
+            'drift_mode': args.drift_mode,
+            'drift_match': args.drift_match,
+            'workers': args.workers,
+            'repeat': args.repeat,
+        },
+        'stages': stages,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(stages, baseline)
+
+    output = args.output or os.path.join(
+        REPO_ROOT, 'benchmarks', 'results', f"{report['meta']['timestamp'].replace(':', '-')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"# Results: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Standalone cfg-drift compliance runner.
+
+Evaluates every expected and forbidden category in one pass over the fleet
+without pytest collection or plugin startup. Produces the same CSV rows as
+the pytest suite.
+
+Usage:
+    python cfg_drift.py check --drift-mode=strict --csv-output
+    python cfg_drift.py watch --interval 60 --csv-output
+    python cfg_drift.py ingest /path/to/2025-01-01T12:00:00Z
+    python cfg_drift.py collect --transport command --source "ssh {device} show run" --inventory devices.txt
+    python cfg_drift.py catalog nearest 2025-01-01T12:00:00Z
+    python cfg_drift.py history timeline leaf01
+    python cfg_drift.py index query "feature telnet"
+"""
+import os
+import sys
+import argparse
+import functools
+
+from tests.common.config_utils import (
+    find_latest_snapshot_dir, collect_device_configs, ResultSink
+)
+from tests.common.engine import ComplianceEngine
+from tests.common.snapshot_store import ingest_snapshot, INGEST_MODES
+from tests.common.snapshot_catalog import SnapshotCatalog, open_catalog, parse_snapshot_timestamp
+from tests.common.history_store import HistoryStore
+from tests.common.line_index import build_line_index, load_line_index
+from tests.common.watcher import SnapshotWatcher
+from tests.common.collector import (
+    TRANSPORTS, DEFAULT_CONCURRENCY, DEFAULT_TIMEOUT, make_transport, read_inventory, collect_snapshot
+)
+from tests.common import profiling
+
+
+def add_common_options(parser):
+    """Options shared with the pytest flags in conftest.py."""
+    parser.add_argument('--drift-mode', default='strict', choices=['strict', 'loose'],
+                        help="Validation mode: 'strict' (exact content match) or 'loose' "
+                             "(presence only). Default: strict")
+    parser.add_argument('--drift-match', default='text', choices=['text', 'tree'],
+                        help="Expected template matching: 'text' (substring of the whole config) "
+                             "or 'tree' (sub-tree of the parsed block hierarchy). Default: text")
+    parser.add_argument('--snap-directory', default='snapshots',
+                        help="Base snapshots directory path. Default: 'snapshots'")
+    parser.add_argument('--snap-timestamp', default=None,
+                        help="Specific snapshot timestamp directory name. "
+                             "Default: most recent timestamp directory")
+    parser.add_argument('--expected-dir', default='supreme_golden_cfg/expected_Q1/fragments',
+                        help="Directory containing expected/required configuration templates")
+    parser.add_argument('--forbidden-dir', default='supreme_golden_cfg/forbidden_Q1/fragments',
+                        help="Directory containing forbidden configuration patterns")
+    parser.add_argument('--cache-dir', default='.cfg_drift_cache',
+                        help="Directory for the compiled golden template bundle; empty to disable. "
+                             "Default: '.cfg_drift_cache'")
+    parser.add_argument('--result-cache', action='store_true',
+                        help="Reuse results of devices whose config and golden templates are "
+                             "unchanged since a previous run (stored in --cache-dir)")
+    parser.add_argument('--mmap-threshold', type=int, default=None,
+                        help="Scan device configs of at least this many bytes via mmap on raw "
+                             "bytes, decoding only reported lines. Default: disabled")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of processes used to evaluate devices in parallel. Default: 1")
+
+
+def get_config(args):
+    """Build the same configuration dict the pytest fixtures use."""
+    return {
+        'snapshots_base': args.snap_directory,
+        'snap_ts': args.snap_timestamp,
+        'expected_dir': args.expected_dir,
+        'forbidden_dir': args.forbidden_dir,
+        'cache_dir': args.cache_dir,
+        'result_cache': args.result_cache,
+        'mode': args.drift_mode,
+        'match': args.drift_match,
+        'csv_output': args.csv_output,
+        'results_dir': args.results_dir,
+        'print_csv': args.print_csv,
+        'mmap_threshold': args.mmap_threshold,
+        'workers': args.workers
+    }
+
+
+def cmd_check(args):
+    """Run every compliance category against the selected snapshot."""
+    if not (args.drift_profile or args.drift_profile_output):
+        return run_check(args)
+
+    profiler = profiling.enable()
+    try:
+        status = run_check(args)
+    finally:
+        profiling.disable()
+    print('\n'.join(profiler.summary()))
+    if args.drift_profile_output:
+        profiler.write(args.drift_profile_output)
+        print(f"# Profile: {args.drift_profile_output}")
+    return status
+
+
+def run_check(args):
+    """Evaluate the selected snapshot and print the results; returns the exit status."""
+    test_config = get_config(args)
+
+    snapshot_dir = find_latest_snapshot_dir(test_config['snapshots_base'], test_config['snap_ts'])
+    if not snapshot_dir:
+        print(f"No snapshot directory found in '{test_config['snapshots_base']}'")
+        return 2
+
+    device_configs = collect_device_configs(snapshot_dir)
+    if not device_configs:
+        print(f"No .cfg files in '{snapshot_dir}'")
+        return 2
+
+    engine = ComplianceEngine(test_config, snapshot_dir)
+    categories = list(engine.iter_categories())
+    if not categories:
+        print(f"No golden categories found in '{test_config['expected_dir']}' "
+              f"or '{test_config['forbidden_dir']}'")
+        return 2
+
+    # Run ID fixed before evaluation starts; the report is written once at the end
+    sink = ResultSink(test_config['results_dir']) if test_config['csv_output'] else None
+    status_counts, failures = engine.run(device_configs, test_config['workers'], sink)
+    csv_file = sink.close() if sink else None
+
+    if csv_file and test_config['print_csv']:
+        with open(csv_file) as f:
+            print(f.read(), end='')
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+
+    passed = status_counts['PASS']
+    failed = sum(status_counts.values()) - passed
+    print(f"# {snapshot_dir}: {len(device_configs)} devices, {len(categories)} categories, "
+          f"{passed} passed, {failed} failed")
+    if engine.result_cache is not None:
+        hits = engine.cache_stats['hits']
+        total = hits + engine.cache_stats['misses']
+        print(f"# Result cache: {hits}/{total} hits ({100.0 * hits / total if total else 0.0:.0f}%)")
+    if csv_file:
+        print(f"# CSV report: {csv_file}")
+
+    return 1 if failures else 0
+
+
+def cmd_ingest(args):
+    """Store a directory of device configs as a deduplicated snapshot."""
+    try:
+        snapshot_dir, devices, new_blobs = ingest_snapshot(
+            args.source_dir, args.snap_directory, args.timestamp, args.mode
+        )
+    except (OSError, ValueError) as e:
+        print(f"Ingest failed: {e}")
+        return 2
+    print(f"# {snapshot_dir}: {devices} devices, {new_blobs} new blobs, "
+          f"{devices - new_blobs} deduplicated")
+
+    catalog = open_catalog(args.snap_directory)
+    if catalog is not None:
+        with catalog:
+            catalog.add(os.path.basename(snapshot_dir))
+    return 0
+
+
+def cmd_collect(args):
+    """Fetch every device config concurrently and publish them as one snapshot."""
+    try:
+        transport = make_transport(args.transport, args.source)
+        if args.inventory:
+            devices = read_inventory(args.inventory)
+        elif hasattr(transport, 'devices'):
+            devices = transport.devices()
+        else:
+            print(f"Transport '{args.transport}' needs an --inventory of devices")
+            return 2
+        snapshot_dir, collected, errors = collect_snapshot(
+            transport, devices, args.snap_directory, args.timestamp,
+            args.concurrency, args.timeout, args.ingest
+        )
+    except (OSError, ValueError) as e:
+        print(f"Collect failed: {e}")
+        return 2
+
+    for device, error in sorted(errors.items()):
+        print(f"FAILED {device}: {error}")
+    if snapshot_dir is None:
+        print(f"# No device collected ({len(errors)} failed); nothing published")
+        return 1
+    print(f"# {snapshot_dir}: {collected} devices collected, {len(errors)} failed")
+
+    catalog = open_catalog(args.snap_directory)
+    if catalog is not None:
+        with catalog:
+            catalog.add(os.path.basename(snapshot_dir))
+    return 1 if errors else 0
+
+
+def timestamp_arg(value):
+    """argparse type for snapshot timestamps (YYYY-MM-DDTHH:MM:SSZ)."""
+    when = parse_snapshot_timestamp(value)
+    if when is None:
+        raise argparse.ArgumentTypeError(f"invalid timestamp '{value}', expected YYYY-MM-DDTHH:MM:SSZ")
+    return when
+
+
+def cmd_catalog(args):
+    """Build or query the snapshot catalog."""
+    if not os.path.isdir(args.snap_directory):
+        print(f"No snapshot directory '{args.snap_directory}'")
+        return 2
+
+    with SnapshotCatalog(args.snap_directory) as catalog:
+        if args.action == 'sync':
+            added, removed = catalog.sync()
+            print(f"# {catalog.path}: {added} added, {removed} removed")
+            return 0
+
+        catalog.refresh()
+        if args.action == 'latest':
+            entries = [catalog.latest()]
+        elif args.action == 'nearest':
+            entries = [catalog.nearest(args.time)]
+        else:
+            entries = catalog.range(args.since, args.until)
+
+        entries = [entry for entry in entries if entry]
+        for entry in entries:
+            print(f"{entry.name}\t{len(catalog.devices(entry.name))} devices\t{entry.path}")
+    return 0 if entries else 1
+
+
+def cmd_history(args):
+    """Update or query the per-device config history."""
+    if not os.path.isdir(args.snap_directory):
+        print(f"No snapshot directory '{args.snap_directory}'")
+        return 2
+
+    with HistoryStore(args.snap_directory) as history:
+        if args.action == 'sync':
+            snapshots, versions = history.sync()
+            print(f"# {history.path}: {snapshots} snapshots recorded, {versions} new versions")
+            return 0
+
+        if args.action == 'timeline':
+            timeline = history.timeline(args.device)
+            for version in timeline:
+                print(f"{version.snapshot}\t{version.kind}\t+{version.added} -{version.removed}")
+            return 0 if timeline else 1
+
+        config = history.config_at(args.device, when=args.at, snapshot=args.snapshot)
+        if config is None:
+            print(f"No config recorded for '{args.device}' at that point")
+            return 1
+        sys.stdout.buffer.write(config)
+    return 0
+
+
+def cmd_watch(args):
+    """Check each new snapshot as it arrives, keeping templates and results in memory."""
+    # Flush each line so logs of a long-running watcher are never held back
+    log = functools.partial(print, flush=True)
+    watcher = SnapshotWatcher(get_config(args), log)
+    log(f"# Watching '{args.snap_directory}' every {args.interval:g}s (Ctrl-C to stop)")
+    try:
+        watcher.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_index(args):
+    """Build or query the inverted line index of a snapshot."""
+    snapshot_dir = find_latest_snapshot_dir(args.snap_directory, args.snap_timestamp)
+    if not snapshot_dir:
+        print(f"No snapshot directory found in '{args.snap_directory}'")
+        return 2
+
+    if not args.cache_dir:
+        print("The line index is stored in --cache-dir, which is disabled")
+        return 2
+
+    if args.action == 'build':
+        devices, lines = build_line_index(args.cache_dir, snapshot_dir)
+        print(f"# {snapshot_dir}: {devices} devices, {lines} distinct lines indexed")
+        return 0
+
+    with load_line_index(args.cache_dir, snapshot_dir, build=True) as index:
+        if args.mode == 'exact':
+            results = {args.text: index.query(args.text)}
+        else:
+            results = index.search(args.text, args.mode)
+
+    results = {line: devices for line, devices in results.items() if devices}
+    for line, devices in results.items():
+        print(f"{line}\t{len(devices)} devices\t{', '.join(devices)}")
+    return 0 if results else 1
+
+
+def main(argv=None):
+    """Parse arguments and dispatch the sub-command."""
+    parser = argparse.ArgumentParser(prog='cfg-drift', description='Network configuration compliance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    check = subparsers.add_parser('check', help='Run all compliance categories without pytest')
+    add_common_options(check)
+    check.add_argument('--csv-output', action='store_true',
+                       help='Generate CSV compliance report in results directory')
+    check.add_argument('--results-dir', default='results',
+                       help="Directory to save CSV compliance reports. Default: 'results'")
+    check.add_argument('--print-csv', action='store_true',
+                       help='Print CSV report to terminal (requires --csv-output)')
+    check.add_argument('--drift-profile', action='store_true',
+                       help='Print wall time, calls, bytes read and peak memory per stage, '
+                            'category and device')
+    check.add_argument('--drift-profile-output', default=None,
+                       help='Also write the --drift-profile timings as JSON to this file')
+    check.set_defaults(func=cmd_check)
+
+    ingest = subparsers.add_parser('ingest', help='Add a snapshot to the content-addressed store')
+    ingest.add_argument('source_dir', help='Directory containing the device .cfg files')
+    ingest.add_argument('--snap-directory', default='snapshots',
+                        help="Base snapshots directory path. Default: 'snapshots'")
+    ingest.add_argument('--timestamp', default=None,
+                        help='Snapshot timestamp directory name. Default: name of source_dir')
+    ingest.add_argument('--mode', default='manifest', choices=INGEST_MODES,
+                        help="'manifest' (one manifest.json per snapshot) or 'hardlink' "
+                             "(.cfg hardlinks into the store). Default: manifest")
+    ingest.set_defaults(func=cmd_ingest, workers=1)
+
+    collect = subparsers.add_parser('collect', help='Fetch device configs concurrently into a new snapshot')
+    collect.add_argument('--transport', default='local', choices=sorted(TRANSPORTS),
+                         help="'local' (read <source>/<device>.cfg) or 'command' (run a command "
+                              "template per device). Default: local")
+    collect.add_argument('--source', required=True,
+                         help="Directory of <device>.cfg files (local) or a command template such as "
+                              "'ssh {device} show running-config' (command)")
+    collect.add_argument('--inventory', default=None,
+                         help='File listing one device per line. Default: every device of a local source')
+    collect.add_argument('--snap-directory', default='snapshots',
+                         help="Base snapshots directory path. Default: 'snapshots'")
+    collect.add_argument('--timestamp', default=None,
+                         help='Snapshot timestamp directory name. Default: current UTC time')
+    collect.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                         help=f'Devices fetched at the same time. Default: {DEFAULT_CONCURRENCY}')
+    collect.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                         help=f'Seconds allowed per device. Default: {DEFAULT_TIMEOUT:g}')
+    collect.add_argument('--ingest', default=None, choices=INGEST_MODES,
+                         help='Store the snapshot in the deduplicated store with this ingest mode. '
+                              'Default: plain directory of .cfg files')
+    collect.set_defaults(func=cmd_collect, workers=1)
+
+    catalog = subparsers.add_parser('catalog', help='Build or query the snapshot catalog')
+    catalog.add_argument('--snap-directory', default='snapshots',
+                         help="Base snapshots directory path. Default: 'snapshots'")
+    actions = catalog.add_subparsers(dest='action', required=True)
+    actions.add_parser('sync', help='Create the catalog or bring it up to date')
+    actions.add_parser('latest', help='Show the most recent snapshot')
+    nearest = actions.add_parser('nearest', help='Show the snapshot closest to a time')
+    nearest.add_argument('time', type=timestamp_arg, help='YYYY-MM-DDTHH:MM:SSZ')
+    time_range = actions.add_parser('range', help='List snapshots between two times')
+    time_range.add_argument('--since', type=timestamp_arg, default=None)
+    time_range.add_argument('--until', type=timestamp_arg, default=None)
+    catalog.set_defaults(func=cmd_catalog, workers=1)
+
+    history = subparsers.add_parser('history', help='Per-device config history (keyframes + deltas)')
+    history.add_argument('--snap-directory', default='snapshots',
+                         help="Base snapshots directory path. Default: 'snapshots'")
+    actions = history.add_subparsers(dest='action', required=True)
+    actions.add_parser('sync', help='Record snapshots newer than the last recorded one')
+    timeline = actions.add_parser('timeline', help="List a device's change points")
+    timeline.add_argument('device')
+    show = actions.add_parser('show', help='Print a device config as of a snapshot or time')
+    show.add_argument('device')
+    point = show.add_mutually_exclusive_group()
+    point.add_argument('--at', type=timestamp_arg, default=None, help='YYYY-MM-DDTHH:MM:SSZ')
+    point.add_argument('--snapshot', default=None, help='Snapshot timestamp directory name')
+    history.set_defaults(func=cmd_history, workers=1)
+
+    watch = subparsers.add_parser('watch', help='Re-check new snapshots as they arrive (hot templates)')
+    add_common_options(watch)
+    watch.add_argument('--interval', type=float, default=30.0,
+                       help='Seconds between polls of the snapshots and golden directories. Default: 30')
+    watch.add_argument('--csv-output', action='store_true',
+                       help='Write a CSV compliance report per checked snapshot')
+    watch.add_argument('--results-dir', default='results',
+                       help="Directory to save CSV compliance reports. Default: 'results'")
+    watch.set_defaults(func=cmd_watch, print_csv=False)
+
+    index = subparsers.add_parser('index', help='Inverted line index: which devices have a config line')
+    index.add_argument('--snap-directory', default='snapshots',
+                       help="Base snapshots directory path. Default: 'snapshots'")
+    index.add_argument('--snap-timestamp', default=None,
+                       help="Specific snapshot timestamp directory name. "
+                            "Default: most recent timestamp directory")
+    index.add_argument('--cache-dir', default='.cfg_drift_cache',
+                       help="Directory holding the line indexes. Default: '.cfg_drift_cache'")
+    actions = index.add_subparsers(dest='action', required=True)
+    actions.add_parser('build', help='Build (or rebuild) the index of the snapshot')
+    query = actions.add_parser('query',
+                               help='List devices having a line (index is built if missing or stale)')
+    query.add_argument('text', help='Config line, or part of one with --prefix/--contains')
+    match = query.add_mutually_exclusive_group()
+    match.add_argument('--prefix', dest='mode', action='store_const', const='prefix',
+                       help='Match lines starting with TEXT')
+    match.add_argument('--contains', dest='mode', action='store_const', const='contains',
+                       help='Match lines containing TEXT')
+    query.set_defaults(mode='exact')
+    index.set_defaults(func=cmd_index, workers=1)
+
+    args = parser.parse_args(argv)
+    if getattr(args, 'concurrency', 1) < 1:
+        parser.error(f"--concurrency must be at least 1, got: {args.concurrency}")
+    if args.workers < 1:
+        parser.error(f"--workers must be at least 1, got: {args.workers}")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,41 +2,170 @@
 """
 Simple configuration drift comparison between snapshots.
 
-Uses standard diff command to show what changed between two snapshots.
+Shows what changed between two snapshots as `diff -u` style unified diffs,
+computed in-process across a pool of worker processes.
 """
 import os
 import sys
-import subprocess
+import difflib
 import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
 
+from tests.common.config_utils import list_snapshots, collect_device_configs
+from tests.common.config_tree import parse_config, diff_trees
+from tests.common.snapshot_readers import read_config_bytes, source_stat
 
-def find_snapshot_directories(snapshots_base):
-    """Find all valid snapshot directories."""
-    if not os.path.isdir(snapshots_base):
-        return []
+# ANSI colors for --color output
+COLORS = {
+    '---': '\033[1m', '+++': '\033[1m', '@@': '\033[36m',
+    '-': '\033[31m', '+': '\033[32m', '~': '\033[33m',
+}
+RESET = '\033[0m'
+NO_NEWLINE = '\\ No newline at end of file\n'
 
-    timestamp_dirs = []
-    for d in os.listdir(snapshots_base):
-        dir_path = os.path.join(snapshots_base, d)
-        if os.path.isdir(dir_path) and d not in ['examples', 'README.md']:
-            if 'T' in d and ('Z' in d or ':' in d):
-                timestamp_dirs.append(d)
 
-    return sorted(timestamp_dirs)
+def find_snapshot_directories(snapshots_base):
+    """Find all valid snapshot timestamps (directories or snapshot archives)."""
+    return list(list_snapshots(snapshots_base))
 
 
 def get_device_configs(snapshot_dir):
-    """Get all .cfg files from a snapshot directory."""
-    if not os.path.isdir(snapshot_dir):
+    """Get all device configs from a snapshot directory or archive."""
+    if not os.path.exists(snapshot_dir):
         return {}
 
-    configs = {}
-    for file in os.listdir(snapshot_dir):
-        if file.endswith('.cfg'):
-            device_name = file[:-4]  # Remove .cfg extension
-            configs[device_name] = os.path.join(snapshot_dir, file)
+    return dict(collect_device_configs(snapshot_dir))
+
+
+def _file_date(stat):
+    """Format an mtime like `diff -u` headers do."""
+    stamp = datetime.fromtimestamp(stat.st_mtime_ns // 10**9, timezone.utc).astimezone()
+    return f"{stamp:%Y-%m-%d %H:%M:%S}.{stat.st_mtime_ns % 10**9:09d} {stamp:%z}"
+
+
+def _diff_lines(data):
+    """Split file bytes into lines, marking a missing final newline like diff does."""
+    lines = data.decode('utf-8', errors='replace').splitlines(keepends=True)
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += '\n' + NO_NEWLINE
+    return lines
+
+
+def unified_diff(old_config, new_config, context=3):
+    """Return the `diff -u` output for two files, or '' when they are identical.
+
+    Compressed and archived configs are compared on their decompressed
+    content; identical configs are detected before any diffing work is done.
+    """
+    old_stat = source_stat(old_config)
+    new_stat = source_stat(new_config)
+
+    old_data = read_config_bytes(old_config)
+    new_data = read_config_bytes(new_config)
+    if old_data == new_data:
+        return ''
+
+    old_lines = _diff_lines(old_data)
+    new_lines = _diff_lines(new_data)
+
+    # autojunk off: repeated lines such as '!' separators must still align
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    output = [
+        f"--- {old_config}\t{_file_date(old_stat)}\n",
+        f"+++ {new_config}\t{_file_date(new_stat)}\n",
+    ]
+    for group in matcher.get_grouped_opcodes(context):
+        first, last = group[0], group[-1]
+        old_range = _hunk_range(first[1], last[2])
+        new_range = _hunk_range(first[3], last[4])
+        output.append(f"@@ -{old_range} +{new_range} @@\n")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                output.extend(' ' + line for line in old_lines[i1:i2])
+                continue
+            if tag in ('replace', 'delete'):
+                output.extend('-' + line for line in old_lines[i1:i2])
+            if tag in ('replace', 'insert'):
+                output.extend('+' + line for line in new_lines[j1:j2])
+
+    # Bytes differed but decoded lines did not (e.g. undecodable bytes)
+    if len(output) == 2:
+        return ''
+    return ''.join(output)
+
+
+def _hunk_range(start, stop):
+    """Format a hunk range the way `diff -u` does (1-based, length omitted when 1)."""
+    length = stop - start
+    if length == 1:
+        return f"{start + 1}"
+    if not length:
+        start -= 1
+    return f"{start + 1},{length}"
 
-    return configs
+
+def semantic_diff(old_config, new_config):
+    """Return an order-insensitive, section-level diff of two configs, or ''.
+
+    Both configs are parsed into section trees and compared block by block:
+    '+' added, '-' removed, '~' section present in both with changes below.
+    Reordered lines or blocks are not reported.
+    """
+    old_data = read_config_bytes(old_config)
+    new_data = read_config_bytes(new_config)
+    if old_data == new_data:
+        return ''
+
+    old_tree = parse_config(old_data.decode('utf-8', errors='replace').splitlines())
+    new_tree = parse_config(new_data.decode('utf-8', errors='replace').splitlines())
+
+    output = []
+    for op, depth, node in diff_trees(old_tree, new_tree):
+        output.append(f"{op} {'  ' * depth}{node.text}\n")
+        if op != '~':
+            # Added/removed sections are shown whole
+            for child in node.walk():
+                child_depth = depth + _depth_below(node, child)
+                output.append(f"{op} {'  ' * child_depth}{child.text}\n")
+    return ''.join(output)
+
+
+def _depth_below(ancestor, node):
+    """Number of levels between ancestor and one of its descendants."""
+    levels = 0
+    while node is not ancestor:
+        node = node.parent
+        levels += 1
+    return levels
+
+
+def colorize(diff_text):
+    """Add ANSI colors to unified diff output."""
+    colored = []
+    for line in diff_text.splitlines(keepends=True):
+        for prefix in ('---', '+++', '@@', '-', '+', '~'):
+            if line.startswith(prefix):
+                colored.append(f"{COLORS[prefix]}{line.rstrip(chr(10))}{RESET}\n")
+                break
+        else:
+            colored.append(line)
+    return ''.join(colored)
+
+
+def diff_device(job):
+    """Diff one device; returns (device, diff text, error message)."""
+    device, old_config, new_config, color, semantic = job
+    try:
+        if semantic:
+            diff_text = semantic_diff(old_config, new_config)
+        else:
+            diff_text = unified_diff(old_config, new_config)
+    except OSError as e:
+        return device, '', f"Error comparing {device}: {e}"
+    if diff_text and color:
+        diff_text = colorize(diff_text)
+    return device, diff_text, None
 
 
 def main():
@@ -51,7 +180,11 @@ def main():
     parser.add_argument('--device-filter',
                        help='Only compare specific device (optional)')
     parser.add_argument('--color', action='store_true',
-                       help='Use colordiff for colored output (falls back to diff if not installed)')
+                       help='Colorize diff output with ANSI colors')
+    parser.add_argument('--semantic', action='store_true',
+                       help='Compare parsed config sections, ignoring line and block order')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                       help='Number of worker processes used to diff devices (default: CPU count)')
 
     args = parser.parse_args()
 
@@ -77,8 +210,9 @@ def main():
         sys.exit(1)
 
     # Get device configurations from both snapshots
-    snapshot_a_dir = os.path.join(args.snapshots_dir, args.snapshot_a)
-    snapshot_b_dir = os.path.join(args.snapshots_dir, args.snapshot_b)
+    snapshots = list_snapshots(args.snapshots_dir)
+    snapshot_a_dir = snapshots[args.snapshot_a]
+    snapshot_b_dir = snapshots[args.snapshot_b]
 
     old_devices = get_device_configs(snapshot_a_dir)
     new_devices = get_device_configs(snapshot_b_dir)
@@ -95,37 +229,28 @@ def main():
     if removed_device_names:
         print(f"# REMOVED: {', '.join(sorted(removed_device_names))}")
 
-    # Compare common devices
+    # Compare common devices; devices resolving to the same stored blob are unchanged
     common_devices = set(old_devices.keys()) & set(new_devices.keys())
-    for device in sorted(common_devices):
-        if args.device_filter and device != args.device_filter:
-            continue
-
-        old_config = old_devices[device]
-        new_config = new_devices[device]
-
-        # Choose diff command based on color option
-        if args.color:
-            # Try colordiff first, fall back to diff
-            diff_cmd = 'colordiff'
-            try:
-                subprocess.run([diff_cmd, '--version'], capture_output=True, check=True)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                diff_cmd = 'diff'
-        else:
-            diff_cmd = 'diff'
-
-        # Just run diff and show output
-        try:
-            result = subprocess.run([diff_cmd, '-u', old_config, new_config],
-                                  capture_output=True, text=True)
-            if result.returncode == 1:  # Files differ
-                print(f"\n## {device}")
-                print(result.stdout)
-            elif result.returncode > 1:  # Error
-                print(f"Error comparing {device}: {result.stderr}")
-        except Exception as e:
-            print(f"Error running diff for {device}: {e}")
+    jobs = [
+        (device, old_devices[device], new_devices[device], args.color, args.semantic)
+        for device in sorted(common_devices)
+        if (not args.device_filter or device == args.device_filter)
+        and old_devices[device] != new_devices[device]
+    ]
+
+    if args.jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            results = list(pool.map(diff_device, jobs, chunksize=max(1, len(jobs) // (args.jobs * 4))))
+    else:
+        results = [diff_device(job) for job in jobs]
+
+    # Print in device order, same layout as `diff -u` per device
+    for device, diff_text, error in results:
+        if error:
+            print(error)
+        elif diff_text:
+            print(f"\n## {device}")
+            print(diff_text)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,13 @@ Provides clean CLI flags for configuring banner compliance tests.
 """
 import pytest
 
+from tests.common.config_utils import RESULT_SINK, ResultSink
+from tests.common.engine import RESULT_CACHE_STATS
+from tests.common import profiling
+
+# Dynamic (category, device) collection, enabled with --drift-collect=dynamic
+pytest_plugins = ["tests.common.drift_plugin"]
+
 def pytest_addoption(parser):
     """Add custom CLI options for cfg-drift configuration."""
 
@@ -19,6 +26,15 @@ def pytest_addoption(parser):
              "Default: strict"
     )
 
+    group.addoption(
+        "--drift-match",
+        action="store",
+        default="text",
+        choices=["text", "tree"],
+        help="Expected template matching: 'text' (substring of the whole config) or 'tree' "
+             "(sub-tree of the parsed config block hierarchy). Default: text"
+    )
+
     group.addoption(
         "--snap-directory",
         action="store",
@@ -72,6 +88,22 @@ def pytest_addoption(parser):
         help="Directory to save CSV compliance reports. Default: 'results'"
     )
 
+    group.addoption(
+        "--cache-dir",
+        action="store",
+        default=".cfg_drift_cache",
+        help="Directory for the compiled golden template bundle; empty to disable. "
+             "Default: '.cfg_drift_cache'"
+    )
+
+    group.addoption(
+        "--result-cache",
+        action="store_true",
+        default=False,
+        help="Reuse results of devices whose config and golden templates are unchanged "
+             "since a previous run (stored in --cache-dir). Default: disabled"
+    )
+
     group.addoption(
         "--print-csv",
         action="store_true",
@@ -79,8 +111,92 @@ def pytest_addoption(parser):
         help="Print CSV report to terminal (requires --csv-output). Default: disabled"
     )
 
+    group.addoption(
+        "--mmap-threshold",
+        action="store",
+        type=int,
+        default=None,
+        help="Scan device configs of at least this many bytes via mmap on raw bytes, "
+             "decoding only reported lines. Default: disabled"
+    )
+
+    group.addoption(
+        "--workers",
+        action="store",
+        type=int,
+        default=1,
+        help="Number of processes used to evaluate devices in parallel. Default: 1"
+    )
+
+    group.addoption(
+        "--drift-collect",
+        action="store",
+        default="modules",
+        choices=["modules", "dynamic"],
+        help="Test collection: 'modules' (generated per-category test files) or 'dynamic' "
+             "(an item per category and device, discovered from the golden directories "
+             "without generated files). Default: modules"
+    )
+
+    group.addoption(
+        "--drift-profile",
+        action="store_true",
+        default=False,
+        help="Record wall time, calls, bytes read and peak memory per stage, category and "
+             "device; prints a summary table at session end. Default: disabled"
+    )
+
+    group.addoption(
+        "--drift-profile-output",
+        action="store",
+        default=None,
+        help="Also write the --drift-profile timings as JSON to this file. Default: none"
+    )
+
 def pytest_configure(config):
     """Validate CLI options after pytest configuration."""
     mode = config.getoption("--drift-mode")
     if mode and mode not in ["strict", "loose"]:
-        raise pytest.UsageError(f"--drift-mode must be 'strict' or 'loose', got: '{mode}'")
\ No newline at end of file
+        raise pytest.UsageError(f"--drift-mode must be 'strict' or 'loose', got: '{mode}'")
+
+    workers = config.getoption("--workers")
+    if workers < 1:
+        raise pytest.UsageError(f"--workers must be at least 1, got: {workers}")
+
+    # One buffered report per session, named by a run ID fixed here
+    if config.getoption("--csv-output"):
+        config.stash[RESULT_SINK] = ResultSink(config.getoption("--results-dir"))
+
+    if config.getoption("--drift-profile") or config.getoption("--drift-profile-output"):
+        profiling.enable()
+
+
+def pytest_unconfigure(config):
+    """Stop --drift-profile instrumentation."""
+    profiling.disable()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    """Write the session's CSV compliance report once, atomically."""
+    sink = session.config.stash.get(RESULT_SINK, None)
+    if sink is not None:
+        sink.close()
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    """Report the result cache hit rate and the --drift-profile summary when enabled."""
+    stats = config.stash.get(RESULT_CACHE_STATS, None)
+    if config.getoption("--result-cache") and stats is not None:
+        total = stats['hits'] + stats['misses']
+        rate = 100.0 * stats['hits'] / total if total else 0.0
+        terminalreporter.write_line(f"cfg-drift result cache: {stats['hits']}/{total} hits ({rate:.0f}%)")
+
+    profiler = profiling.active()
+    if profiler is not None:
+        terminalreporter.write_sep("-", "cfg-drift profile")
+        for line in profiler.summary():
+            terminalreporter.write_line(line)
+        output = config.getoption("--drift-profile-output")
+        if output:
+            profiler.write(output)
+            terminalreporter.write_line(f"cfg-drift profile written to {output}")
@@ -0,0 +1,105 @@
+"""
+Single-pass extraction of delimited and multi-line config blocks.
+
+Some config sections are not single lines: banners (``banner motd ^C`` ...
+``^C``, for every banner type), certificate chains (``crypto pki certificate
+chain`` and its indented hex data) and macros (``macro name`` ... ``@``).
+extract_blocks() finds all of them in one linear pass over the lines, with
+their line numbers, so every check that needs blocks shares one extraction.
+"""
+import re
+from collections import namedtuple
+
+# kind: 'banner', 'certificate' or 'macro'; name: banner type, chain or macro
+# name; start/end: 1-based line numbers (inclusive); complete: False when the
+# config ended before the block's terminator
+Block = namedtuple('Block', ['kind', 'name', 'start', 'end', 'lines', 'complete'])
+
+# Start of a line that may open a block, for skipping ahead in raw bytes
+BLOCK_START = re.compile(rb'(?m)^[ \t]*(?:banner |crypto pki certificate chain |macro name )')
+
+CERTIFICATE_CHAIN = 'crypto pki certificate chain '
+MACRO_NAME = 'macro name '
+MACRO_END = '@'
+
+
+def extract_blocks(lines, first_lineno=1):
+    """Yield every Block of ``lines`` in config order.
+
+    ``lines`` may be any iterable and is read once; ``first_lineno`` is the
+    line number of its first line (when starting mid-file).
+    """
+    lines = iter(lines)
+    lineno = first_lineno - 1
+    pending = None  # line read past the end of an indented block
+
+    while True:
+        if pending is not None:
+            line, pending = pending, None
+        else:
+            line = next(lines, None)
+            if line is None:
+                return
+            lineno += 1
+        stripped = line.strip()
+        start = lineno
+
+        if stripped.startswith('banner '):
+            parts = stripped.split(None, 2)
+            if len(parts) < 3:
+                continue
+            # The delimiter is the first character after the banner type (^C counts as one)
+            rest = parts[2]
+            delimiter = '^C' if rest.startswith('^C') else rest[0]
+            content = rest[len(delimiter):].lstrip()
+            block_lines = [line]
+
+            # Inline banners: "banner motd ^Ccontent^C"
+            if content:
+                if delimiter in content:
+                    yield Block('banner', parts[1], start, lineno,
+                                [line, content.split(delimiter, 1)[0], delimiter], True)
+                    continue
+                block_lines.append(content)
+
+            complete = False
+            for next_line in lines:
+                lineno += 1
+                next_stripped = next_line.strip()
+                if next_stripped.endswith(delimiter):
+                    # Terminator on its own line, or closing the last content line
+                    if next_stripped != delimiter:
+                        block_lines.append(next_line.rstrip()[:-len(delimiter)])
+                    block_lines.append(delimiter)
+                    complete = True
+                    break
+                block_lines.append(next_line)
+            yield Block('banner', parts[1], start, lineno, block_lines, complete)
+
+        elif stripped.startswith(MACRO_NAME):
+            block_lines = [line]
+            complete = False
+            for next_line in lines:
+                lineno += 1
+                block_lines.append(next_line)
+                if next_line.strip() == MACRO_END:
+                    complete = True
+                    break
+            yield Block('macro', stripped[len(MACRO_NAME):].strip(), start, lineno, block_lines, complete)
+
+        elif stripped.startswith(CERTIFICATE_CHAIN):
+            # The chain is the header plus every following line indented deeper
+            indent = len(line) - len(line.lstrip())
+            block_lines = [line]
+            end = lineno
+            for next_line in lines:
+                lineno += 1
+                if next_line.strip() and len(next_line) - len(next_line.lstrip()) <= indent:
+                    pending = next_line
+                    break
+                block_lines.append(next_line)
+                end = lineno
+            while len(block_lines) > 1 and not block_lines[-1].strip():
+                block_lines.pop()
+                end -= 1
+            yield Block('certificate', stripped[len(CERTIFICATE_CHAIN):].strip(), start, end, block_lines, True)
@@ -0,0 +1,170 @@
+"""
+Concurrent snapshot collector.
+
+Fetches the running config of every device of an inventory with asyncio,
+at most ``concurrency`` devices at a time and each within ``timeout``
+seconds, through a pluggable transport. Configs are written to a hidden
+directory under the snapshots base and the timestamp directory is published
+with one rename (or ingested into the content-addressed store), so
+find_latest_snapshot_dir() never sees a half-written snapshot.
+
+Transports are registered by name; each is built from one ``source``
+string and provides ``async fetch(device) -> bytes``:
+
+- ``local``: reads ``<source>/<device>.cfg``, a fake device fleet for tests
+- ``command``: runs a command template such as
+  ``"ssh {device} show running-config"`` and captures its output
+"""
+import os
+import shlex
+import shutil
+import asyncio
+from datetime import datetime, timezone
+
+from tests.common.snapshot_store import ingest_snapshot
+
+DEFAULT_CONCURRENCY = 64
+DEFAULT_TIMEOUT = 30.0
+
+
+class LocalTransport:
+    """Serve configs from ``<source>/<device>.cfg``, optionally with a simulated latency."""
+
+    def __init__(self, source, delay=0.0):
+        self.source = source
+        self.delay = delay
+
+    def devices(self):
+        """All devices of the fake fleet, used when no inventory is given."""
+        return sorted(f[:-4] for f in os.listdir(self.source) if f.endswith('.cfg'))
+
+    async def fetch(self, device):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        with open(os.path.join(self.source, f"{device}.cfg"), 'rb') as f:
+            return f.read()
+
+
+class CommandTransport:
+    """Run ``source`` (with ``{device}`` substituted) and return its standard output.
+
+    The command is split into arguments before substitution, so a device
+    name is always passed as (part of) one argument, never re-parsed.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.args = shlex.split(source)
+
+    async def fetch(self, device):
+        args = [arg.format(device=device) for arg in self.args]
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            # Timed out: do not leave the command running
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            message = stderr.decode('utf-8', errors='ignore').strip()
+            raise OSError(f"'{args[0]}' exited with status {process.returncode}: {message}")
+        return stdout
+
+
+# Transport name -> factory taking the --source string
+TRANSPORTS = {
+    'local': LocalTransport,
+    'command': CommandTransport,
+}
+
+
+def register_transport(name, factory):
+    """Make ``factory(source)`` available as transport ``name``."""
+    TRANSPORTS[name] = factory
+
+
+def make_transport(name, source):
+    """Build the registered transport ``name`` for ``source``."""
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown transport '{name}', expected one of {tuple(TRANSPORTS)}")
+    return TRANSPORTS[name](source)
+
+
+def read_inventory(path):
+    """Device names of an inventory file: one per line, '#' starts a comment."""
+    devices = []
+    with open(path) as f:
+        for line in f:
+            device = line.split('#', 1)[0].strip()
+            if device:
+                devices.append(device)
+    return devices
+
+
+def snapshot_timestamp(when=None):
+    """Snapshot directory name for ``when`` (default: now), e.g. 2025-01-01T12:00:00Z."""
+    return (when or datetime.now(timezone.utc)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+async def fetch_all(transport, devices, out_dir, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """Fetch every device into ``out_dir/<device>.cfg``; returns {device: error} of failures."""
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = {}
+
+    async def fetch(device):
+        async with semaphore:
+            try:
+                data = await asyncio.wait_for(transport.fetch(device), timeout)
+            except asyncio.TimeoutError:
+                errors[device] = f"timed out after {timeout:g}s"
+                return
+            except Exception as e:
+                errors[device] = str(e) or type(e).__name__
+                return
+        with open(os.path.join(out_dir, f"{device}.cfg"), 'wb') as f:
+            f.write(data)
+
+    await asyncio.gather(*(fetch(device) for device in devices))
+    return errors
+
+
+def collect_snapshot(transport, devices, snapshots_base, timestamp=None, concurrency=DEFAULT_CONCURRENCY,
+                     timeout=DEFAULT_TIMEOUT, mode=None):
+    """Collect one snapshot of ``devices`` and publish it atomically.
+
+    ``mode`` None publishes a plain directory of .cfg files; 'manifest' or
+    'hardlink' ingests it into the snapshot store instead. Devices that fail
+    are left out of the snapshot. Returns (snapshot_dir, devices collected,
+    {device: error}); nothing is published when every device failed.
+    """
+    devices = list(dict.fromkeys(devices))
+    for device in devices:
+        if not device or device.startswith('.') or os.sep in device or (os.altsep and os.altsep in device):
+            raise ValueError(f"Invalid device name '{device}'")
+
+    timestamp = timestamp or snapshot_timestamp()
+    snapshot_dir = os.path.join(snapshots_base, timestamp)
+    if os.path.exists(snapshot_dir):
+        raise FileExistsError(f"Snapshot '{snapshot_dir}' already exists")
+
+    # Hidden while being written: list_snapshots() skips dot-entries
+    tmp_dir = os.path.join(snapshots_base, f".{timestamp}.{os.getpid()}.collect")
+    os.makedirs(tmp_dir)
+    try:
+        errors = asyncio.run(fetch_all(transport, devices, tmp_dir, concurrency, timeout))
+        collected = len(devices) - len(errors)
+        if not collected:
+            shutil.rmtree(tmp_dir)
+            return None, 0, errors
+        if mode is None:
+            os.rename(tmp_dir, snapshot_dir)
+        else:
+            ingest_snapshot(tmp_dir, snapshots_base, timestamp, mode)
+            shutil.rmtree(tmp_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return snapshot_dir, collected, errors
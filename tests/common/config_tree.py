@@ -0,0 +1,235 @@
+"""
+Hierarchical parser for indentation-based NX-OS/IOS configurations.
+
+Turns config lines into a parent/child tree so fragments can be matched
+block by block instead of as substrings of the whole flattened file.
+"""
+import os
+import hashlib
+from collections import Counter
+from itertools import islice
+
+from tests.common.config_utils import read_file
+from tests.common.templates import is_template, cached_template, variables
+
+# Shared empty child list for leaf nodes; replaced on first add_child()
+_NO_CHILDREN = ()
+
+
+class ConfigNode:
+    """One config line and the lines indented beneath it."""
+
+    __slots__ = ('text', 'indent', 'lineno', 'parent', 'children', '_index', '_digest')
+
+    def __init__(self, text, indent, lineno, parent):
+        self.text = text
+        self.indent = indent
+        self.lineno = lineno
+        self.parent = parent
+        self.children = _NO_CHILDREN
+        self._index = None
+        self._digest = None
+
+    def __repr__(self):
+        return f"ConfigNode({self.text!r}, line={self.lineno}, children={len(self.children)})"
+
+    @property
+    def key(self):
+        """Case-insensitive lookup key of this line."""
+        return self.text.lower()
+
+    def add_child(self, node):
+        if self.children is _NO_CHILDREN:
+            self.children = []
+        self.children.append(node)
+        self._index = None
+        self._digest = None
+
+    def find(self, key):
+        """Return the children whose key equals ``key``, in config order."""
+        if self._index is None:
+            index = {}
+            for child in self.children:
+                index.setdefault(child.key, []).append(child)
+            self._index = index
+        return self._index.get(key, _NO_CHILDREN)
+
+    def digest(self):
+        """Order-insensitive hash of this line and everything beneath it.
+
+        Sibling order is ignored, so reordered blocks hash the same.
+        """
+        if self._digest is None:
+            h = hashlib.blake2b(self.text.encode(), digest_size=16)
+            for child_digest in sorted(child.digest() for child in self.children):
+                h.update(child_digest)
+            self._digest = h.digest()
+        return self._digest
+
+    def walk(self):
+        """Yield every descendant node depth-first, in config order."""
+        for child in self.children:
+            yield child
+            yield from child.walk()
+
+
+def parse_config(lines):
+    """Parse config lines into a tree; returns the (text-less) root node.
+
+    Blank lines and ``!`` comment lines are skipped, and whitespace inside a
+    line is collapsed the same way normalize_text() does.
+    """
+    root = ConfigNode('', -1, 0, None)
+    stack = [root]
+
+    for lineno, line in enumerate(lines, 1):
+        line = line.expandtabs()
+        stripped = line.strip()
+        if not stripped or stripped.startswith('!'):
+            continue
+
+        indent = len(line) - len(line.lstrip())
+        while stack[-1].indent >= indent:
+            stack.pop()
+
+        node = ConfigNode(' '.join(stripped.split()), indent, lineno, stack[-1])
+        stack[-1].add_child(node)
+        stack.append(node)
+
+    return root
+
+
+def contains_tree(node, fragment):
+    """Check that every child of ``fragment`` appears under ``node``, recursively.
+
+    Matching is case-insensitive and order-insensitive among siblings, and
+    sibling fragment lines match different device lines, as they would in
+    the flat text. Each fragment block is only compared with same-keyed
+    blocks of the device, so cost is bounded by the size of the matched
+    blocks, not the whole config. Fragment lines with placeholders match any
+    sibling their regex matches.
+    """
+    return match_tree(node, fragment) is not None
+
+
+def match_tree(node, fragment):
+    """Like contains_tree(), returning the {name: value} captured by placeholders, or None.
+
+    A variable used on several fragment lines must have the same value
+    (compared case-insensitively) on all of them, as within one template.
+    """
+    return next(_match_children(node, fragment.children, 0, {}, frozenset()), None)
+
+
+def _match_children(node, children, index, bindings, used):
+    """Yield every bindings dict under which ``children[index:]`` appear under ``node``.
+
+    ``used`` holds the children of ``node`` already matched by earlier
+    fragment siblings.
+    """
+    if index == len(children):
+        yield bindings
+        return
+
+    child = children[index]
+    placeholders = _has_placeholders(child)
+    for candidate, bound in _match_line(node, child, bindings):
+        if candidate in used:
+            continue
+        inner = _match_children(candidate, child.children, 0, bound, frozenset())
+        if not placeholders:
+            # Nothing bound beneath: one way of matching the block is as good as any other
+            inner = islice(inner, 1)
+        for inner_bindings in inner:
+            yield from _match_children(node, children, index + 1, inner_bindings, used | {candidate})
+
+
+def _match_line(node, child, bindings):
+    """Yield (candidate, bindings) for each child of ``node`` matching the line of ``child``."""
+    if not is_template(child.text):
+        for candidate in node.find(child.key):
+            yield candidate, bindings
+        return
+
+    # Placeholder lines are compared with every sibling at this level
+    regex = cached_template(child.text)
+    for candidate in node.children:
+        match = regex.fullmatch(candidate.text)
+        if match is None:
+            continue
+        captured = variables(match)
+        if all(bindings[name].lower() == value.lower() for name, value in captured.items() if name in bindings):
+            yield candidate, {**bindings, **captured}
+
+
+def _has_placeholders(fragment):
+    return is_template(fragment.text) or any(is_template(node.text) for node in fragment.walk())
+
+
+def diff_trees(old, new, depth=0):
+    """Structurally diff the children of two nodes, ignoring sibling order.
+
+    Yields (op, depth, node) with op '-' (removed), '+' (added) or '~'
+    (same line, changed beneath; followed by the nested changes at
+    depth + 1). Siblings are paired by their exact text; sub-trees with equal
+    digests are skipped without being walked, so cost follows the size of
+    the change rather than of the config.
+    """
+    if old.digest() == new.digest():
+        return
+
+    old_by_text = {}
+    for child in old.children:
+        old_by_text.setdefault(child.text, []).append(child)
+    new_by_text = {}
+    for child in new.children:
+        new_by_text.setdefault(child.text, []).append(child)
+
+    for text in dict.fromkeys(list(old_by_text) + list(new_by_text)):
+        old_nodes = old_by_text.get(text, [])
+        new_nodes = new_by_text.get(text, [])
+
+        # Drop identical sub-trees present on both sides
+        common = Counter(n.digest() for n in old_nodes) & Counter(n.digest() for n in new_nodes)
+        if common:
+            old_nodes = _without(old_nodes, common)
+            new_nodes = _without(new_nodes, common)
+
+        # Same block on both sides with different contents: descend into it
+        while old_nodes and new_nodes:
+            old_node, new_node = old_nodes.pop(0), new_nodes.pop(0)
+            yield '~', depth, new_node
+            yield from diff_trees(old_node, new_node, depth + 1)
+
+        for node in old_nodes:
+            yield '-', depth, node
+        for node in new_nodes:
+            yield '+', depth, node
+
+
+def _without(nodes, digests):
+    """Remove one node per digest occurrence in ``digests`` (a Counter)."""
+    remaining = Counter(digests)
+    kept = []
+    for node in nodes:
+        if remaining[node.digest()]:
+            remaining[node.digest()] -= 1
+        else:
+            kept.append(node)
+    return kept
+
+
+def load_golden_config_trees(base_dir, category_name):
+    """Parse all .cfg fragments of a category into trees, keeping indentation."""
+    category_path = os.path.join(base_dir, category_name)
+    trees = {}
+
+    if not os.path.isdir(category_path):
+        return trees
+
+    for filename in sorted(os.listdir(category_path)):
+        file_path = os.path.join(category_path, filename)
+        if os.path.isfile(file_path) and filename.endswith('.cfg'):
+            trees[filename] = parse_config(read_file(file_path))
+
+    return trees
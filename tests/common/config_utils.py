@@ -5,14 +5,26 @@ Common functions used across all test modules for device configuration validatio
 """
 import os
 import re
-import glob
 import csv
+import mmap
 import pytest
+from collections import namedtuple
+from collections.abc import Mapping
+from contextlib import contextmanager
 from datetime import datetime
 
+from tests.common.snapshot_store import read_manifest, resolve_manifest
+from tests.common.snapshot_readers import (
+    open_config, is_plain_file, config_suffix, device_name, archive_suffix, list_archive
+)
+from tests.common.snapshot_catalog import open_catalog
+from tests.common.line_table import LineTable
+from tests.common.profiling import stage, add_bytes
+from tests.common.blocks import BLOCK_START, extract_blocks
+
 
 def get_config(request):
-    """Get configuration from CLI flags."""
+    """Get configuration from CLI flags (of a fixture request or any node with ``.config``)."""
     return {
         'snapshots_base': request.config.getoption("--snap-directory"),
         'snap_ts': request.config.getoption("--snap-timestamp"),
@@ -20,26 +32,195 @@ def get_config(request):
         'expected_dir': request.config.getoption("--expected-dir"),
         'forbidden_dir': request.config.getoption("--forbidden-dir"),
         'mode': request.config.getoption("--drift-mode").lower(),
+        'match': request.config.getoption("--drift-match"),
         'csv_output': request.config.getoption("--csv-output"),
         'results_dir': request.config.getoption("--results-dir"),
-        'print_csv': request.config.getoption("--print-csv")
+        'cache_dir': request.config.getoption("--cache-dir"),
+        'result_cache': request.config.getoption("--result-cache"),
+        'print_csv': request.config.getoption("--print-csv"),
+        'mmap_threshold': request.config.getoption("--mmap-threshold"),
+        'workers': request.config.getoption("--workers"),
+        'result_sink': request.config.stash.get(RESULT_SINK, None)
     }
 
 
 def read_file(path):
-    """Read file content, ignoring encoding errors."""
-    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-        return f.read().splitlines()
+    """Read file content, ignoring encoding errors.
+
+    Compressed configs and archive members are decoded as a stream.
+    """
+    with stage('read'):
+        if is_plain_file(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+        else:
+            with open_config(path) as f:
+                data = f.read()
+        add_bytes(len(data))
+        return data.decode('utf-8', errors='ignore').splitlines()
+
+
+# Read-only view of one device config: raw lines, newline-joined text and
+# its lowercased form used for case-insensitive pattern matching
+DeviceConfig = namedtuple('DeviceConfig', ['name', 'path', 'lines', 'text', 'folded'])
+
+
+# Start of a line that may open a banner block, for extract_banner() on raw bytes
+BANNER_LINE = re.compile(rb'(?m)^[ \t]*banner ')
+
+
+class MappedConfig:
+    """Device config scanned in place through mmap instead of decoded into str.
+
+    Used for very large configs: pattern checks run on the raw bytes and only
+    lines that get reported (e.g. the banner block) are decoded. The file is
+    mapped per operation, so no descriptors stay open between checks.
+    """
+
+    __slots__ = ('name', 'path')
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    @contextmanager
+    def buffer(self):
+        """Map the file read-only; yields b'' for empty files (mmap rejects them)."""
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                yield b''
+                return
+            add_bytes(size)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                yield buf
+
+    @property
+    def lines(self):
+        """Fully decoded lines, for checks that need the whole config."""
+        return tuple(read_file(self.path))
+
+    def extract_banner(self):
+        """extract_banner() decoding only the lines from the first banner candidate on."""
+        with self.buffer() as buf:
+            match = BANNER_LINE.search(buf)
+            if not match:
+                return None
+            return extract_banner(_iter_decoded_lines(buf, match.start()))
+
+    def extract_blocks(self):
+        """All extract_blocks() blocks, decoding only from the first block candidate on."""
+        with self.buffer() as buf:
+            match = BLOCK_START.search(buf)
+            if not match:
+                return []
+            # mmap has no count(); count line breaks before the match in bounded chunks
+            start = match.start()
+            first_lineno = 1 + sum(
+                buf[pos:min(pos + (1 << 20), start)].count(b'\n') for pos in range(0, start, 1 << 20)
+            )
+            return list(extract_blocks(_iter_decoded_lines(buf, start), first_lineno))
+
+
+class InternedConfig:
+    """Device config held as LineTable ids, sharing line strings across the fleet.
+
+    Kept by DeviceStore for the whole session instead of a DeviceConfig;
+    ``lines`` is rebuilt on access, ``text`` and ``folded`` are decoded on
+    first access and kept (the engine scans ids and never needs them).
+    """
+
+    __slots__ = ('name', 'path', 'ids', 'table', '_text', '_folded')
+
+    def __init__(self, name, path, ids, table):
+        self.name = name
+        self.path = path
+        self.ids = ids
+        self.table = table
+        self._text = None
+        self._folded = None
+
+    @property
+    def lines(self):
+        return tuple(self.table.decode(self.ids))
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = '\n'.join(self.table.decode(self.ids))
+        return self._text
+
+    @property
+    def folded(self):
+        if self._folded is None:
+            self._folded = self.text.lower()
+        return self._folded
+
+
+def _iter_decoded_lines(buf, pos):
+    """Decode lines of a bytes buffer lazily, starting at byte offset pos."""
+    size = len(buf)
+    while pos < size:
+        end = buf.find(b'\n', pos)
+        if end == -1:
+            end = size
+        yield buf[pos:end].rstrip(b'\r').decode('utf-8', errors='ignore')
+        pos = end + 1
+
+
+def load_device_config(device, path, mmap_threshold=None):
+    """Read, decode and lowercase a device config once.
+
+    Files of at least ``mmap_threshold`` bytes are returned as a MappedConfig
+    and scanned as raw bytes instead; compressed and archived configs never are.
+    """
+    if mmap_threshold is not None and is_plain_file(path) and os.path.getsize(path) >= mmap_threshold:
+        return MappedConfig(device, path)
+
+    with stage('load', device=device):
+        lines = tuple(read_file(path))
+        text = '\n'.join(lines)
+        return DeviceConfig(device, path, lines, text, text.lower())
+
+
+class DeviceStore(Mapping):
+    """Session cache of device configs, loaded on first access and shared by all tests.
+
+    Configs are interned into one LineTable, so lines repeated across the
+    fleet are held once.
+    """
+
+    def __init__(self, device_configs, mmap_threshold=None):
+        self._paths = dict(device_configs)
+        self._mmap_threshold = mmap_threshold
+        self._configs = {}
+        self.table = LineTable()
+
+    def __getitem__(self, device):
+        config = self._configs.get(device)
+        if config is None:
+            config = load_device_config(device, self._paths[device], self._mmap_threshold)
+            if isinstance(config, DeviceConfig):
+                config = InternedConfig(device, config.path, self.table.encode(config.lines), self.table)
+            self._configs[device] = config
+        return config
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self):
+        return len(self._paths)
 
 
 def normalize_text(lines):
     """Clean lines for comparison: remove timestamps, normalize whitespace."""
-    cleaned = []
-    for line in lines:
-        # Skip auto-generated timestamp comments
-        if re.match(r'^\s*!.*(Generated|build|\d{4}-\d{2}-\d{2}|UTC|local)', line, re.IGNORECASE):
-            continue
-        cleaned.append(' '.join(line.strip().split()))
+    with stage('normalize'):
+        cleaned = []
+        for line in lines:
+            # Skip auto-generated timestamp comments
+            if re.match(r'^\s*!.*(Generated|build|\d{4}-\d{2}-\d{2}|UTC|local)', line, re.IGNORECASE):
+                continue
+            cleaned.append(' '.join(line.strip().split()))
 
     # Remove empty lines from start/end
     while cleaned and not cleaned[0]:
@@ -51,67 +232,88 @@ def normalize_text(lines):
 
 
 def extract_banner(lines):
-    """Extract full banner block: header + content + terminator."""
-    for i, line in enumerate(lines):
-        stripped = line.strip()
-        if not stripped.startswith('banner '):
-            continue
-
-        parts = stripped.split(None, 3)
-        if len(parts) < 3:
-            continue
-
-        delimiter = parts[2]
-        banner_lines = [line]
-
-        # Handle inline banners: "banner motd ^Ccontent^C"
-        if len(parts) >= 4:
-            content = parts[3]
-            if content.endswith(delimiter):
-                return [line, content[:-len(delimiter)], delimiter]
-            banner_lines.append(content)
-
-        # Collect lines until delimiter
-        for j in range(i + 1, len(lines)):
-            if lines[j].strip() == delimiter:
-                banner_lines.append(lines[j].strip())
-                return banner_lines
-            banner_lines.append(lines[j])
-
-        return banner_lines  # EOF reached
-
+    """Extract the first full banner block: header + content + terminator.
+
+    ``lines`` may be any iterable; it is consumed only up to the banner end.
+    See extract_blocks() for every banner and other delimited blocks.
+    """
+    for block in extract_blocks(lines):
+        if block.kind == 'banner':
+            return block.lines
     return None
 
 
-def find_latest_snapshot_dir(snapshots_base, snap_ts=None):
-    """Find the most recent snapshot directory."""
-    if snap_ts:
-        candidate = os.path.join(snapshots_base, snap_ts)
-        return candidate if os.path.isdir(candidate) else None
+def list_snapshots(snapshots_base):
+    """Return {timestamp: path} of all snapshots, as directories or archive files.
 
+    Read from the snapshot catalog when the base directory has one.
+    """
     if not os.path.isdir(snapshots_base):
-        return None
+        return {}
+
+    catalog = open_catalog(snapshots_base)
+    if catalog is not None:
+        with catalog:
+            return {entry.name: entry.path for entry in catalog.range()}
 
     # Filter for timestamp-like directories (YYYY-MM-DDTHH:MM:SSZ format)
     # Ignore examples, README.md, and other non-timestamp directories
-    timestamp_dirs = []
+    snapshots = {}
     for d in os.listdir(snapshots_base):
         dir_path = os.path.join(snapshots_base, d)
-        if os.path.isdir(dir_path) and d not in ['examples', 'README.md']:
+        # Hidden entries are the blob store and snapshots still being ingested
+        if d.startswith('.'):
+            continue
+        suffix = archive_suffix(d)
+        if suffix and os.path.isfile(dir_path):
+            d = d[:-len(suffix)]
+        elif not os.path.isdir(dir_path):
+            continue
+        if d not in ['examples', 'README.md']:
             # Basic check for timestamp format (contains T and ends with Z or has : )
             if 'T' in d and ('Z' in d or ':' in d):
-                timestamp_dirs.append(d)
+                snapshots[d] = dir_path
+
+    return dict(sorted(snapshots.items()))
+
+
+def find_latest_snapshot_dir(snapshots_base, snap_ts=None):
+    """Find the most recent snapshot directory (or snapshot archive)."""
+    if snap_ts:
+        candidate = os.path.join(snapshots_base, snap_ts)
+        if os.path.isdir(candidate):
+            return candidate
+
+    catalog = open_catalog(snapshots_base) if os.path.isdir(snapshots_base) else None
+    if catalog is not None:
+        with catalog:
+            entry = catalog.get(snap_ts) if snap_ts else catalog.latest()
+        return entry.path if entry else None
 
-    if not timestamp_dirs:
+    snapshots = list_snapshots(snapshots_base)
+    if snap_ts:
+        return snapshots.get(snap_ts)
+    if not snapshots:
         return None
 
-    return os.path.join(snapshots_base, sorted(timestamp_dirs)[-1])
+    return snapshots[max(snapshots)]
 
 
 def collect_device_configs(snapshot_dir):
-    """Get all .cfg files from snapshot directory."""
-    cfg_files = glob.glob(os.path.join(snapshot_dir, '*.cfg'))
-    return [(os.path.splitext(os.path.basename(f))[0], f) for f in sorted(cfg_files)]
+    """Get all device configs (.cfg, .cfg.gz, .cfg.zst) from snapshot directory.
+
+    Snapshots ingested as a manifest resolve to their blobs in the store, and
+    snapshot archives to their members.
+    """
+    if archive_suffix(snapshot_dir) and os.path.isfile(snapshot_dir):
+        return list_archive(snapshot_dir)
+
+    manifest = read_manifest(snapshot_dir)
+    if manifest is not None:
+        return resolve_manifest(snapshot_dir, manifest)
+
+    cfg_files = [f for f in os.listdir(snapshot_dir) if config_suffix(f)]
+    return sorted((device_name(f), os.path.join(snapshot_dir, f)) for f in cfg_files)
 
 
 def load_golden_config_fragments(base_dir, category_name):
@@ -130,17 +332,24 @@ def load_golden_config_fragments(base_dir, category_name):
     return fragments
 
 
-def check_patterns_in_config(config_lines, patterns):
-    """Check if any patterns appear in configuration lines."""
-    config_text = '\n'.join(config_lines).lower()
-    found_patterns = []
+def list_categories(base_dir):
+    """List category directories under base_dir that contain .cfg fragments."""
+    if not os.path.isdir(base_dir):
+        return []
+
+    categories = []
+    for category_name in sorted(os.listdir(base_dir)):
+        category_path = os.path.join(base_dir, category_name)
+        if os.path.isdir(category_path) and any(f.endswith('.cfg') for f in os.listdir(category_path)):
+            categories.append(category_name)
+
+    return categories
 
-    for pattern_name, pattern_content in patterns.items():
-        # Check if the pattern content appears in the config
-        if pattern_content.lower().strip() in config_text:
-            found_patterns.append((pattern_name, pattern_content.strip()))
 
-    return found_patterns
+def load_all_golden_fragments(base_dir):
+    """Load fragments for every category under base_dir: {category: fragments}."""
+    return {category: load_golden_config_fragments(base_dir, category)
+            for category in list_categories(base_dir)}
 
 
 # Common fixtures
@@ -168,30 +377,138 @@ def device_configs(snapshot_directory):
     return configs
 
 
+@pytest.fixture(scope="session")
+def device_store(device_configs, test_config):
+    """Session-wide device config cache: each file is read and lowercased once."""
+    return DeviceStore(device_configs, test_config['mmap_threshold'])
+
+
 # CSV Reporting Functions
-def write_csv_report(test_config, results):
-    """Write compliance results to CSV file."""
-    if not test_config['csv_output']:
-        return
+CSV_HEADER = ['Timestamp', 'Device', 'Category', 'Template_Used', 'Status', 'Mode', 'Details']
+
+# Rows buffered in memory before a sink spills them to its part file
+DEFAULT_FLUSH_SIZE = 5000
+
+# pytest stash key for the session-wide sink created in conftest.py
+RESULT_SINK = pytest.StashKey()
+
+
+def new_run_id():
+    """Run ID naming the report of one session, fixed when the session starts.
+
+    The process ID keeps runs started within the same second apart.
+    """
+    return f"{datetime.now().strftime('%Y-%m-%dT%H-%M-%S')}_{os.getpid()}"
+
+
+class ResultSink:
+    """Buffered collector writing one compliance CSV report per run.
+
+    Rows are buffered in memory and spilled to part files once
+    ``flush_size`` rows accumulate. Each sink only writes its own part files,
+    so workers sharing a run ID need no locking. close() on the main sink
+    (``part=None``) merges every part of the run, in part-name order, into
+    ``compliance_<run_id>.csv`` through an atomic rename.
+    """
+
+    def __init__(self, results_dir, run_id=None, flush_size=DEFAULT_FLUSH_SIZE, part=None):
+        self.results_dir = results_dir
+        self.run_id = run_id or new_run_id()
+        self.flush_size = flush_size
+        self.part = part
+        self._buffer = []
+        self._spills = 0
+
+    @property
+    def path(self):
+        """Final CSV report path."""
+        return os.path.join(self.results_dir, f"compliance_{self.run_id}.csv")
+
+    @property
+    def parts_dir(self):
+        """Directory holding unmerged part files of this run."""
+        return os.path.join(self.results_dir, f".compliance_{self.run_id}.parts")
+
+    def for_part(self, part):
+        """Create a worker sink writing its own part files under this run ID."""
+        return ResultSink(self.results_dir, self.run_id, self.flush_size, part)
+
+    def add(self, rows):
+        """Buffer rows, spilling to a part file when the buffer is full."""
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """Spill buffered rows to a new part file owned by this sink."""
+        if not self._buffer:
+            return
+        os.makedirs(self.parts_dir, exist_ok=True)
+        part_file = os.path.join(self.parts_dir, f"{self.part or 'main'}-{self._spills:05d}.csv")
+        with stage('csv'), open(part_file, 'w', newline='') as f:
+            csv.writer(f).writerows(self._buffer)
+        self._spills += 1
+        self._buffer = []
+
+    def close(self):
+        """Flush remaining rows; the main sink then writes the final report.
+
+        Returns the report path, or None if no rows were ever added.
+        """
+        self.flush()
+        if self.part is not None or not os.path.isdir(self.parts_dir):
+            return None
+
+        part_files = sorted(os.listdir(self.parts_dir))
+        tmp_file = os.path.join(self.results_dir, f".compliance_{self.run_id}.csv.tmp")
+        with stage('csv'), open(tmp_file, 'w', newline='') as out:
+            csv.writer(out).writerow(CSV_HEADER)
+            for part_file in part_files:
+                with open(os.path.join(self.parts_dir, part_file), newline='') as f:
+                    for chunk in iter(lambda: f.read(1 << 20), ''):
+                        out.write(chunk)
+        os.replace(tmp_file, self.path)
+
+        for part_file in part_files:
+            os.remove(os.path.join(self.parts_dir, part_file))
+        os.rmdir(self.parts_dir)
+        return self.path
+
+    def append(self, rows):
+        """Append rows straight to the final report, writing the header first.
+
+        For callers without a session that would close() the sink; returns
+        the report path.
+        """
+        os.makedirs(self.results_dir, exist_ok=True)
+        new_report = not os.path.exists(self.path)
+        with stage('csv'), open(self.path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if new_report:
+                writer.writerow(CSV_HEADER)
+            writer.writerows(rows)
+        return self.path
 
-    # Create results directory
-    results_dir = test_config['results_dir']
-    os.makedirs(results_dir, exist_ok=True)
 
-    # Generate timestamp filename (shared across session)
-    timestamp = datetime.now().strftime("%Y-%m-%dT%H-%M")  # Minute precision for session sharing
-    csv_file = os.path.join(results_dir, f"compliance_{timestamp}.csv")
+def write_csv_report(test_config, results):
+    """Write compliance results to CSV file.
 
-    # Check if file exists to determine if we need header
-    file_exists = os.path.isfile(csv_file)
+    Rows go to the session sink in ``test_config['result_sink']`` and are
+    written once when the session finishes; without a session sink they are
+    appended immediately to one report per ``test_config``.
+    """
+    if not test_config['csv_output']:
+        return
 
-    # Append to CSV file
-    with open(csv_file, 'a', newline='') as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(['Timestamp', 'Device', 'Category', 'Template_Used', 'Status', 'Mode', 'Details'])
-        for result in results:
-            writer.writerow(result)
+    sink = test_config.get('result_sink')
+    if sink is not None:
+        sink.add(results)
+        csv_file = sink.path
+    else:
+        sink = test_config.get('report_sink')
+        if sink is None:
+            sink = test_config['report_sink'] = ResultSink(test_config['results_dir'])
+        csv_file = sink.append(results)
 
     # Print CSV to terminal if requested (only for this batch)
     if test_config['print_csv']:
@@ -213,4 +530,9 @@ def log_compliance_result(device, category, template, status, mode, details=""):
         if not details.startswith(original_status):
             details = f"{original_status}: {details}" if details else original_status
 
-    return [timestamp, device, category, template, status, mode, details]
\ No newline at end of file
+    return [timestamp, device, category, template, status, mode, details]
+
+
+def summarize_failures(failures, devices):
+    """Assertion message listing every non-compliant device of a category."""
+    return f"{len(failures)} of {devices} devices non-compliant:\n" + '\n'.join(failures)
@@ -0,0 +1,210 @@
+"""
+Dynamic collection of compliance tests (--drift-collect=dynamic).
+
+Instead of importing one generated module per category from tests/expected
+and tests/forbidden, the categories are discovered from --expected-dir and
+--forbidden-dir at collection time and every (category, device) pair becomes
+a lightweight item, e.g. ``expected::aaa::leaf01``. New categories need no
+generate_tests.py run, ``-k`` selects categories and devices, and each
+non-compliant device is reported on its own.
+
+Discovery (category names and the device list of the selected snapshot) is
+cached in --cache-dir and reused while the fragment and snapshot directories
+are unchanged.
+"""
+import os
+import json
+import hashlib
+
+import pytest
+
+from tests.common.config_utils import (
+    get_config, find_latest_snapshot_dir, collect_device_configs, list_categories,
+    DeviceStore, write_csv_report
+)
+from tests.common.golden_bundle import KINDS
+from tests.common.engine import ComplianceEngine, RESULT_CACHE_STATS
+
+# Bump when the cached discovery layout changes
+DISCOVERY_VERSION = 1
+
+# Generated modules replaced by dynamic collection
+GENERATED_DIRS = {'expected': 'required', 'forbidden': 'forbidden'}
+
+# pytest stash key for the session-wide state shared by all items
+DRIFT_STATE = pytest.StashKey()
+
+
+class DriftState:
+    """Session-wide configuration, device store and engine, built on first use."""
+
+    def __init__(self, test_config, snapshot_dir, device_configs):
+        self.test_config = test_config
+        self.snapshot_dir = snapshot_dir
+        self.device_configs = device_configs
+        self._engine = None
+        self._store = None
+
+    def engine(self, config):
+        """Compliance engine, primed like the compliance_engine fixture."""
+        if self._engine is None:
+            engine = ComplianceEngine(self.test_config, self.snapshot_dir)
+            if self.test_config['workers'] > 1 or engine.result_cache is not None:
+                engine.prime(self.device_configs, self.test_config['workers'])
+            config.stash[RESULT_CACHE_STATS] = engine.cache_stats
+            self._engine = engine
+        return self._engine
+
+    def device_store(self):
+        if self._store is None:
+            self._store = DeviceStore(self.device_configs, self.test_config['mmap_threshold'])
+        return self._store
+
+
+class DriftFailure(Exception):
+    """Non-compliant device; the message is the engine's failure text."""
+
+
+class DriftCategory(pytest.Collector):
+    """One golden category; collects an item per device of the snapshot."""
+
+    def __init__(self, kind, category, **kwargs):
+        super().__init__(**kwargs)
+        self.kind = kind
+        self.category = category
+
+    def collect(self):
+        state = self.config.stash[DRIFT_STATE]
+        if not state.snapshot_dir:
+            pytest.skip(f"No snapshot directory found in '{state.test_config['snapshots_base']}'")
+        if not state.device_configs:
+            pytest.skip(f"No .cfg files in '{state.snapshot_dir}'")
+        for device, _ in state.device_configs:
+            yield DriftItem.from_parent(self, name=device, kind=self.kind, category=self.category)
+
+
+class DriftItem(pytest.Item):
+    """Evaluate one category for one device."""
+
+    def __init__(self, kind, category, **kwargs):
+        super().__init__(**kwargs)
+        self.kind = kind
+        self.category = category
+        self.extra_keyword_matches.add(kind)
+
+    def runtest(self):
+        state = self.config.stash[DRIFT_STATE]
+        engine = state.engine(self.config)
+        # Banners are checked as complete blocks by the engine, like test_banners_required
+        rows, failure = engine.evaluate(self.kind, self.category, state.device_store()[self.name])
+        write_csv_report(state.test_config, rows)
+        if failure:
+            raise DriftFailure(failure)
+
+    def repr_failure(self, excinfo):
+        if isinstance(excinfo.value, DriftFailure):
+            return str(excinfo.value)
+        return super().repr_failure(excinfo)
+
+    def reportinfo(self):
+        return self.path, None, f"{self.kind} {self.category}: {self.name}"
+
+
+def discovery_cache_path(cache_dir, test_config, snapshot_dir):
+    """Cache file for one (expected_dir, forbidden_dir, snapshot) combination."""
+    key = hashlib.sha1("\0".join(
+        os.path.abspath(path) for path in (test_config['expected_dir'], test_config['forbidden_dir'], snapshot_dir)
+    ).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"discovery_{key}.json")
+
+
+def discovery_signature(test_config, snapshot_dir):
+    """Return {path: mtime_ns} of the directories whose listing discovery depends on.
+
+    Adding or removing a fragment or category changes the mtime of its
+    directory; snapshots change their directory (or archive/manifest) mtime.
+    """
+    paths = [snapshot_dir, os.path.join(snapshot_dir, 'manifest.json')]
+    for kind in KINDS:
+        base_dir = test_config[f'{kind}_dir']
+        paths.append(base_dir)
+        if os.path.isdir(base_dir):
+            paths.extend(entry.path for entry in os.scandir(base_dir) if entry.is_dir())
+
+    signature = {}
+    for path in paths:
+        try:
+            signature[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+    return signature
+
+
+def discover(test_config, snapshot_dir):
+    """Return ({kind: [category]}, [(device, path)]), cached in --cache-dir."""
+    cache_dir = test_config.get('cache_dir')
+    if not cache_dir:
+        return _discover(test_config, snapshot_dir)
+
+    cache_file = discovery_cache_path(cache_dir, test_config, snapshot_dir)
+    signature = discovery_signature(test_config, snapshot_dir)
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+        if cached['version'] == DISCOVERY_VERSION and cached['signature'] == signature:
+            return cached['categories'], [tuple(entry) for entry in cached['devices']]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    categories, device_configs = _discover(test_config, snapshot_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({'version': DISCOVERY_VERSION, 'signature': signature,
+                   'categories': categories, 'devices': device_configs}, f)
+    os.replace(tmp_file, cache_file)
+    return categories, device_configs
+
+
+def _discover(test_config, snapshot_dir):
+    categories = {kind: list_categories(test_config[f'{kind}_dir']) for kind in KINDS}
+    return categories, collect_device_configs(snapshot_dir)
+
+
+def _dynamic(config):
+    return config.getoption("--drift-collect") == 'dynamic'
+
+
+def pytest_ignore_collect(collection_path, config):
+    """Skip the generated category modules when collecting dynamically."""
+    if not _dynamic(config) or collection_path.suffix != '.py':
+        return None
+    suffix = GENERATED_DIRS.get(collection_path.parent.name)
+    if suffix and collection_path.name.startswith('test_') and collection_path.stem.endswith(f'_{suffix}'):
+        return True
+    return None
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(session, config, items):
+    """Add an item per (category, device) ahead of -k/-m deselection."""
+    if not _dynamic(config):
+        return
+
+    test_config = get_config(session)
+    snapshot_dir = find_latest_snapshot_dir(test_config['snapshots_base'], test_config['snap_ts'])
+    if snapshot_dir:
+        categories, device_configs = discover(test_config, snapshot_dir)
+    else:
+        categories, device_configs = {kind: list_categories(test_config[f'{kind}_dir']) for kind in KINDS}, []
+    config.stash[DRIFT_STATE] = DriftState(test_config, snapshot_dir, device_configs)
+
+    for kind in KINDS:
+        base_dir = test_config[f'{kind}_dir']
+        for category in categories[kind]:
+            collector = DriftCategory.from_parent(
+                session, name=category, nodeid=f"{kind}::{category}",
+                path=config.rootpath.joinpath(base_dir, category),
+                kind=kind, category=category,
+            )
+            items.extend(session.genitems(collector))
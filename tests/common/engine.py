@@ -0,0 +1,521 @@
+"""
+Single-pass compliance engine.
+
+Loads every expected and forbidden category once, scans each device config
+once for all of them and returns the rows log_compliance_result() produces.
+Used by the pytest category tests and by the standalone ``cfg_drift.py check``.
+"""
+import os
+import pytest
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from tests.common.config_utils import (
+    MappedConfig, InternedConfig, load_device_config, normalize_text, log_compliance_result
+)
+from tests.common.blocks import extract_blocks
+from tests.common.config_tree import parse_config, match_tree
+from tests.common.golden_bundle import KINDS, load_golden_bundle
+from tests.common.result_cache import ResultCache
+from tests.common.line_index import load_line_index
+from tests.common.profiling import stage
+from tests.common.matcher import Match
+from tests.common.templates import is_template, cached_template, literal_anchor, variables, format_variables
+from tests.common.snapshot_readers import config_digest
+
+# pytest stash key exposing result cache hits/misses to the terminal summary
+RESULT_CACHE_STATS = pytest.StashKey()
+
+# pytest stash key for the engine shared by every test module
+COMPLIANCE_ENGINE = pytest.StashKey()
+
+# Part of the result cache key: bump whenever result rows or failure
+# messages change, so results cached by an older version are recomputed
+RESULTS_VERSION = 3
+
+# Shards per worker: small enough to balance uneven config sizes
+SHARDS_PER_WORKER = 4
+
+# Devices whose matches, trees and blocks are kept between evaluate() calls;
+# the least recently used device is dropped beyond this
+SCAN_CACHE_DEVICES = 1024
+
+
+class ComplianceEngine:
+    """Evaluate device configs against all golden categories.
+
+    ``snapshot_dir`` is the snapshot the evaluated devices come from; when it
+    has an up-to-date line index in the cache directory (``cfg_drift.py index
+    build``), forbidden categories the index rules out for a device are
+    answered without scanning its config.
+    """
+
+    def __init__(self, test_config, snapshot_dir=None):
+        self.test_config = test_config
+        self.snapshot_dir = snapshot_dir
+        self.mode = test_config['mode']
+        self.match = test_config.get('match', 'text')
+        self.mmap_threshold = test_config.get('mmap_threshold')
+
+        # Golden library compiled once and cached on disk until a fragment changes
+        with stage('templates'):
+            self.bundle = load_golden_bundle(
+                test_config['expected_dir'], test_config['forbidden_dir'], test_config.get('cache_dir')
+            )
+        self.categories = self.bundle.categories
+        self.matcher = self.bundle.matcher
+
+        # Tree mode matches expected fragments as sub-trees of the parsed config
+        self.trees = self.bundle.trees if self.match == 'tree' else {}
+
+        self.line_index = None
+        if snapshot_dir and test_config.get('cache_dir'):
+            self.line_index = load_line_index(test_config['cache_dir'], snapshot_dir)
+
+        # Results of unchanged devices are reused across runs when enabled
+        self.result_cache = None
+        if test_config.get('result_cache') and test_config.get('cache_dir'):
+            os.makedirs(test_config['cache_dir'], exist_ok=True)
+            self.result_cache = ResultCache(os.path.join(test_config['cache_dir'], 'results.sqlite'))
+        self.cache_key = f"v{RESULTS_VERSION}:{self.mode}:{self.match}"
+        self.cache_stats = Counter(hits=0, misses=0)
+
+        self._scans = OrderedDict()
+        self._evaluated = {}
+        self._results = {}
+
+    def iter_categories(self):
+        """Yield (kind, category) pairs in evaluation order."""
+        for kind in KINDS:
+            for category in self.categories[kind]:
+                yield kind, category
+
+    def fragments(self, kind, category):
+        """Return the {template_name: content} fragments of a category."""
+        return self.categories[kind].get(category, {})
+
+    def load(self, device, config_path):
+        """Load a device config, memory-mapping files above --mmap-threshold."""
+        return load_device_config(device, config_path, self.mmap_threshold)
+
+    def _device_scans(self, device):
+        scans = self._scans.get(device)
+        if scans is None:
+            scans = self._scans[device] = {}
+            if len(self._scans) > SCAN_CACHE_DEVICES:
+                evicted, _ = self._scans.popitem(last=False)
+                self._evaluated.pop(evicted, None)
+        else:
+            self._scans.move_to_end(device)
+        return scans
+
+    def release(self, device):
+        """Drop the matches, tree and blocks cached for a device."""
+        self._scans.pop(device, None)
+        self._evaluated.pop(device, None)
+
+    def clear(self):
+        """Drop everything cached per device, including results from prime()."""
+        self._scans.clear()
+        self._evaluated.clear()
+        self._results.clear()
+
+    def scan(self, config):
+        """Return fragment matches for all categories, scanning each device once."""
+        scans = self._device_scans(config.name)
+        if 'matches' not in scans:
+            with stage('match'):
+                if isinstance(config, MappedConfig):
+                    with config.buffer() as buf:
+                        scans['matches'] = self.matcher.scan_buffer(buf)
+                elif isinstance(config, InternedConfig):
+                    scans['matches'] = self.matcher.scan_interned(config.ids, config.table)
+                else:
+                    scans['matches'] = self.matcher.scan(config.folded, config.text)
+        return scans['matches']
+
+    def tree(self, config):
+        """Return the parsed config tree, parsing each device once."""
+        scans = self._device_scans(config.name)
+        if 'tree' not in scans:
+            with stage('parse'):
+                scans['tree'] = parse_config(config.lines)
+        return scans['tree']
+
+    def blocks(self, config):
+        """Return the device's delimited blocks (see extract_blocks()), extracting each device once."""
+        scans = self._device_scans(config.name)
+        if 'blocks' not in scans:
+            with stage('blocks'):
+                if isinstance(config, MappedConfig):
+                    scans['blocks'] = config.extract_blocks()
+                else:
+                    scans['blocks'] = list(extract_blocks(config.lines))
+        return scans['blocks']
+
+    def evaluate(self, kind, category, config):
+        """Evaluate one category for one device.
+
+        Returns (rows, failure) where failure is the assertion message for a
+        non-compliant device, or None. Results computed by prime() are reused.
+        """
+        results = self._results.get(config.name)
+        if results is not None:
+            return results[(kind, category)]
+        result = self._evaluate_category(kind, category, config)
+
+        # Scans are only needed until every category has run for this device
+        evaluated = self._evaluated.setdefault(config.name, set())
+        evaluated.add((kind, category))
+        if len(evaluated) == sum(len(self.categories[kind]) for kind in KINDS):
+            self.release(config.name)
+        return result
+
+    def _evaluate_category(self, kind, category, config):
+        with stage('evaluate', category=f"{kind}/{category}", device=config.name):
+            if kind == 'expected' and category == 'banners':
+                return self._evaluate_banners(config)
+            if kind == 'expected':
+                return self._evaluate_expected(category, config)
+            return self._evaluate_forbidden(category, config)
+
+    def evaluate_categories(self, config):
+        """Evaluate every category for one device: {(kind, category): (rows, failure)}."""
+        results = {
+            (kind, category): self._evaluate_category(kind, category, config)
+            for kind, category in self.iter_categories()
+        }
+
+        # Matches and trees are only needed while this device is evaluated
+        self.release(config.name)
+        return results
+
+    def evaluate_path(self, device, config_path):
+        """evaluate_categories() for a device file, reusing cached results when enabled.
+
+        Results are keyed by device, config content hash, golden template set
+        hash, results version and drift mode/match options.
+        """
+        if self.result_cache is None:
+            return self.evaluate_categories(self.load(device, config_path))
+
+        content_hash = config_digest(config_path)
+        results = self.result_cache.get(device, content_hash, self.bundle.digest, self.cache_key, config_path)
+        if results is not None:
+            self.cache_stats['hits'] += 1
+            return results
+
+        self.cache_stats['misses'] += 1
+        results = self.evaluate_categories(self.load(device, config_path))
+        self.result_cache.put(device, content_hash, self.bundle.digest, self.cache_key, results, config_path)
+        return results
+
+    def flush_cache(self):
+        """Persist results queued in the result cache."""
+        if self.result_cache is not None:
+            self.result_cache.flush()
+
+    def evaluate_device(self, config):
+        """Evaluate every category for one device; returns (rows, failures)."""
+        rows = []
+        failures = []
+        for category_rows, failure in self.evaluate_categories(config).values():
+            rows.extend(category_rows)
+            if failure:
+                failures.append(failure)
+        return rows, failures
+
+    def iter_results(self, device_configs, workers=1):
+        """Yield (device, evaluate_categories() results) in device_configs order.
+
+        With workers > 1 devices are sharded across a process pool; shards are
+        merged back in input order so output is deterministic. Workers only
+        compute results; reporting stays with the caller.
+        """
+        if workers <= 1 or len(device_configs) < 2:
+            for device, config_path in device_configs:
+                yield device, self.evaluate_path(device, config_path)
+            self.flush_cache()
+            return
+
+        with self._pool(workers) as pool:
+            for shard_results, cache_stats in pool.map(_evaluate_shard, _shard(device_configs, workers)):
+                self.cache_stats.update(cache_stats)
+                yield from shard_results
+
+    def prime(self, device_configs, workers=1):
+        """Evaluate all devices up front so evaluate() only returns cached results."""
+        for device, results in self.iter_results(device_configs, workers):
+            self._results[device] = results
+
+    def run(self, device_configs, workers=1, sink=None):
+        """Evaluate every category for every (device, path).
+
+        Rows go to ``sink`` (a ResultSink, or None to discard them); with
+        workers > 1 each shard writes its own part file under the sink's run
+        ID. Returns (status_counts, failures) with failures in device order.
+        """
+        status_counts = Counter()
+        failures = []
+
+        if workers <= 1 or len(device_configs) < 2:
+            for device, config_path in device_configs:
+                results = self.evaluate_path(device, config_path)
+                _record(results, sink, status_counts, failures)
+            self.flush_cache()
+            return status_counts, failures
+
+        shards = _shard(device_configs, workers)
+        part_sinks = [sink.for_part(f"shard-{index:05d}") if sink else None for index in range(len(shards))]
+        with self._pool(workers) as pool:
+            for shard_counts, shard_failures, cache_stats in pool.map(_run_shard, shards, part_sinks):
+                status_counts.update(shard_counts)
+                failures.extend(shard_failures)
+                self.cache_stats.update(cache_stats)
+        return status_counts, failures
+
+    def _pool(self, workers):
+        # Workers rebuild the engine from config; report sinks stay in this process
+        worker_config = {key: value for key, value in self.test_config.items()
+                         if key not in ('result_sink', 'report_sink')}
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(worker_config, self.snapshot_dir))
+
+    def _evaluate_expected(self, category, config):
+        templates = self.fragments('expected', category)
+        if category in self.trees:
+            device_tree = self.tree(config)
+            matched_templates = []
+            for template_name, template_tree in self.trees[category].items():
+                captured = match_tree(device_tree, template_tree)
+                if captured is not None:
+                    matched_templates.append(Match(template_name, None, captured))
+        else:
+            matched_templates = self.scan(config).get(('expected', category), [])
+
+        if matched_templates:
+            # First matching template in template order
+            match = matched_templates[0]
+            template_name = match.pattern_name
+            details = 'Exact match' if self.mode == 'strict' else 'Configuration present (loose mode)'
+            details += format_variables(match.variables)
+            return [log_compliance_result(
+                config.name, category, template_name, 'PASS', self.mode, details
+            )], None
+
+        rows = [log_compliance_result(
+            config.name, category, 'any template', 'MISSING', self.mode,
+            f'No {category} configuration found'
+        )]
+        failure = None
+        if self.mode == 'strict':
+            failure = (
+                f"{config.name}: No {category} configuration found matching templates in "
+                f"expected_dir/{category}/ ({len(templates)} templates checked)"
+            )
+        return rows, failure
+
+    def _evaluate_forbidden(self, category, config):
+        patterns = self.fragments('forbidden', category)
+        if self._ruled_out(config.name, patterns):
+            found_patterns = {}
+        else:
+            found_patterns = {
+                match.pattern_name: match for match in self.scan(config).get(('forbidden', category), [])
+            }
+
+        rows = []
+        for template_name in patterns:
+            if template_name in found_patterns:
+                match = found_patterns[template_name]
+                rows.append(log_compliance_result(
+                    config.name, category, template_name, 'FORBIDDEN', self.mode,
+                    f"Found: {match.content}{format_variables(match.variables)}"
+                ))
+            else:
+                rows.append(log_compliance_result(
+                    config.name, category, template_name, 'PASS', self.mode,
+                    'Not found (compliant)'
+                ))
+
+        failure = None
+        if found_patterns:
+            pattern_details = [
+                f"'{match.content}' (from {pattern_file})"
+                for pattern_file, match in found_patterns.items()
+            ]
+            failure = (
+                f"{config.name}: Found forbidden {category} configuration in {config.path}:\n"
+                f"  Forbidden patterns detected: {', '.join(pattern_details)}\n"
+                f"  These patterns are forbidden per forbidden_dir/{category}/"
+            )
+        return rows, failure
+
+    def _ruled_out(self, device, fragments):
+        """True if the line index shows that ``device`` contains none of ``fragments``."""
+        if self.line_index is None:
+            return False
+        return not any(
+            self.line_index.may_contain(device, literal_anchor(content) if is_template(content) else content.lower())
+            for content in fragments.values()
+        )
+
+    def _evaluate_banners(self, config):
+        banner_templates = self.fragments('expected', 'banners')
+
+        # Every banner block (motd, exec, login, ...): header + content + terminator
+        banners = [block for block in self.blocks(config) if block.kind == 'banner']
+        incomplete = [block for block in banners if not block.complete]
+        # Terminated without any content between header and terminator
+        empty = [block for block in banners if block.complete and not any(line.strip() for line in block.lines[1:-1])]
+        complete = [block for block in banners if block.complete and block not in empty]
+
+        if not complete:
+            return [log_compliance_result(
+                config.name, 'banners', 'N/A', 'MISSING', self.mode,
+                'No complete banner found'
+            )], (
+                f"{config.name}: No complete banner found in {config.path}. "
+                f"Expected: header + content + terminator"
+            )
+
+        rows = []
+        for block in banners:
+            if block in complete:
+                continue
+            problem = 'is empty' if block.complete else 'not terminated'
+            rows.append(log_compliance_result(
+                config.name, 'banners', 'N/A', 'MISSING', self.mode,
+                f"Banner {block.name} {problem} (line {block.start})"
+            ))
+
+        if self.mode != 'strict':
+            # Loose mode - banner exists, that's enough
+            rows.append(log_compliance_result(
+                config.name, 'banners', 'any template', 'PASS', self.mode,
+                'Banner present (loose mode)'
+            ))
+            return rows, self._banner_failure(config, incomplete, empty, [])
+
+        # Normalize each device banner (remove timestamps, whitespace) and compare to ANY template
+        label = len(banners) > 1
+        mismatched = []
+        for block in complete:
+            suffix = f" (banner {block.name})" if label else ''
+            matched = self._match_banner(normalize_text(block.lines), banner_templates)
+            if matched is None:
+                mismatched.append(block)
+                rows.append(log_compliance_result(
+                    config.name, 'banners', 'any template', 'FAIL', self.mode,
+                    'Banner content mismatch' + suffix
+                ))
+            else:
+                template_name, captured = matched
+                rows.append(log_compliance_result(
+                    config.name, 'banners', template_name, 'PASS', self.mode,
+                    'Exact match' + format_variables(captured) + suffix
+                ))
+        return rows, self._banner_failure(config, incomplete, empty, mismatched, label)
+
+    @staticmethod
+    def _match_banner(device_banner, banner_templates):
+        """(template name, captured variables) of the first matching template, or None."""
+        for template_name, template_content in banner_templates.items():
+            if device_banner == template_content:
+                return template_name, {}
+            if is_template(template_content):
+                match = cached_template(template_content).fullmatch(device_banner)
+                if match:
+                    return template_name, variables(match)
+        return None
+
+    def _banner_failure(self, config, incomplete, empty, mismatched, label=False):
+        messages = []
+        if incomplete:
+            messages.append(
+                f"{config.name}: Banner {', '.join(block.name for block in incomplete)} not terminated "
+                f"in {config.path}"
+            )
+        if empty:
+            messages.append(
+                f"{config.name}: Banner {', '.join(block.name for block in empty)} is empty in {config.path}"
+            )
+        if mismatched:
+            templates = len(self.fragments('expected', 'banners'))
+            which = ', '.join(block.name for block in mismatched)
+            if not label:
+                subject = "Banner doesn't"
+            elif len(mismatched) == 1:
+                subject = f"Banner {which} doesn't"
+            else:
+                subject = f"Banners {which} don't"
+            messages.append(
+                f"{config.name}: {subject} match any expected template in 'banners/' ({templates} templates checked)"
+            )
+        return '\n'.join(messages) or None
+
+
+# Process pool workers: one engine per worker process, built by the initializer
+_worker_engine = None
+
+
+def _init_worker(test_config, snapshot_dir):
+    global _worker_engine
+    _worker_engine = ComplianceEngine(test_config, snapshot_dir)
+
+
+def _evaluate_shard(shard):
+    _worker_engine.cache_stats.clear()
+    shard_results = [
+        (device, _worker_engine.evaluate_path(device, config_path))
+        for device, config_path in shard
+    ]
+    _worker_engine.flush_cache()
+    return shard_results, _worker_engine.cache_stats
+
+
+def _run_shard(shard, sink):
+    _worker_engine.cache_stats.clear()
+    status_counts = Counter()
+    failures = []
+    for device, config_path in shard:
+        results = _worker_engine.evaluate_path(device, config_path)
+        _record(results, sink, status_counts, failures)
+    _worker_engine.flush_cache()
+    if sink is not None:
+        sink.close()
+    return status_counts, failures, _worker_engine.cache_stats
+
+
+def _shard(device_configs, workers):
+    """Split devices into contiguous shards, SHARDS_PER_WORKER per worker."""
+    shard_size = max(1, -(-len(device_configs) // (workers * SHARDS_PER_WORKER)))
+    return [device_configs[i:i + shard_size] for i in range(0, len(device_configs), shard_size)]
+
+
+def _record(results, sink, status_counts, failures):
+    """Send one device's rows to the sink and tally statuses and failures."""
+    for rows, failure in results.values():
+        if sink is not None:
+            sink.add(rows)
+        status_counts.update(row[4] for row in rows)
+        if failure:
+            failures.append(failure)
+
+
+@pytest.fixture(scope="session")
+def compliance_engine(request, test_config, snapshot_directory, device_configs):
+    """Compliance engine with all golden categories loaded once per session.
+
+    With --workers N or --result-cache every device is evaluated up front,
+    across N processes and/or from cached results of unchanged devices.
+    """
+    # Each test module imports this fixture, which pytest registers per module
+    engine = request.config.stash.get(COMPLIANCE_ENGINE, None)
+    if engine is None:
+        engine = ComplianceEngine(test_config, snapshot_directory)
+        if test_config['workers'] > 1 or engine.result_cache is not None:
+            engine.prime(device_configs, test_config['workers'])
+        request.config.stash[RESULT_CACHE_STATS] = engine.cache_stats
+        request.config.stash[COMPLIANCE_ENGINE] = engine
+    return engine
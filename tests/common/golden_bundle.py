@@ -0,0 +1,126 @@
+"""
+Precompiled bundle of all golden config categories.
+
+Loading the golden library means listing every category directory, reading
+every fragment and normalizing it line by line. The bundle holds the result
+(normalized text, parsed trees and the compiled fragment matcher), pickled
+to a cache file and reused as long as no fragment changed.
+"""
+import os
+import pickle
+import hashlib
+
+from tests.common.config_utils import list_categories, load_all_golden_fragments
+from tests.common.config_tree import load_golden_config_trees
+from tests.common.matcher import FragmentMatcher
+
+# Bump when the bundle layout changes so stale cache files are rebuilt
+BUNDLE_VERSION = 8
+
+KINDS = ('expected', 'forbidden')
+
+
+class GoldenBundle:
+    """Everything derived from the golden fragments, ready for matching.
+
+    ``categories[kind][category]`` maps template names to normalized text,
+    ``trees`` holds the parsed expected fragments and ``matcher`` one
+    automaton over all fragments. ``digest`` identifies the exact template
+    set (e.g. to key cached results).
+    """
+
+    def __init__(self, expected_dir, forbidden_dir):
+        dirs = {'expected': expected_dir, 'forbidden': forbidden_dir}
+        self.categories = {kind: load_all_golden_fragments(dirs[kind]) for kind in KINDS}
+        self.trees = {
+            category: load_golden_config_trees(expected_dir, category)
+            for category in self.categories['expected'] if category != 'banners'
+        }
+
+        self.matcher = FragmentMatcher()
+        for kind in KINDS:
+            for category, fragments in self.categories[kind].items():
+                self.matcher.add_fragments((kind, category), fragments)
+        self.matcher.build()
+
+        digest = hashlib.sha1()
+        for kind in KINDS:
+            for category in self.categories[kind]:
+                for filename in self.categories[kind][category]:
+                    digest.update(f"{kind}/{category}/{filename}\0".encode())
+                    with open(os.path.join(dirs[kind], category, filename), 'rb') as f:
+                        digest.update(f.read())
+        self.digest = digest.hexdigest()
+
+
+def fragment_signature(expected_dir, forbidden_dir):
+    """Return {path: (mtime_ns, size)} for every .cfg fragment of both libraries."""
+    signature = {}
+    for base_dir in (expected_dir, forbidden_dir):
+        for category in list_categories(base_dir):
+            with os.scandir(os.path.join(base_dir, category)) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.cfg') and entry.is_file():
+                        stat = entry.stat()
+                        signature[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return signature
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def bundle_cache_path(cache_dir, expected_dir, forbidden_dir):
+    """Cache file for one (expected_dir, forbidden_dir) pair."""
+    key = hashlib.sha1(
+        f"{os.path.abspath(expected_dir)}\0{os.path.abspath(forbidden_dir)}".encode()
+    ).hexdigest()[:12]
+    return os.path.join(cache_dir, f"golden_bundle_{key}.pickle")
+
+
+def load_golden_bundle(expected_dir, forbidden_dir, cache_dir=None):
+    """Return the golden bundle, reusing the cached copy when fragments are unchanged.
+
+    A fragment counts as unchanged when its mtime and size match the cache,
+    or, if they differ (e.g. after a fresh checkout), when its content hash
+    still matches. Without ``cache_dir`` the bundle is always rebuilt.
+    """
+    if not cache_dir:
+        return GoldenBundle(expected_dir, forbidden_dir)
+
+    cache_file = bundle_cache_path(cache_dir, expected_dir, forbidden_dir)
+    signature = fragment_signature(expected_dir, forbidden_dir)
+
+    cached = None
+    if os.path.isfile(cache_file):
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            cached = None
+
+    if cached and cached['version'] == BUNDLE_VERSION and cached['files'].keys() == signature.keys():
+        stale = [path for path, stat in signature.items() if cached['files'][path][:2] != stat]
+        if not stale:
+            return cached['bundle']
+        if all(_file_hash(path) == cached['files'][path][2] for path in stale):
+            # Only timestamps moved: keep the bundle, refresh the recorded stats
+            files = {path: stat + (cached['files'][path][2],) for path, stat in signature.items()}
+            _write_cache(cache_file, cached['bundle'], files)
+            return cached['bundle']
+
+    bundle = GoldenBundle(expected_dir, forbidden_dir)
+    files = {path: stat + (_file_hash(path),) for path, stat in signature.items()}
+    _write_cache(cache_file, bundle, files)
+    return bundle
+
+
+def _write_cache(cache_file, bundle, files):
+    """Pickle the bundle through a temp file so readers never see a partial cache."""
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wb') as f:
+        pickle.dump({'version': BUNDLE_VERSION, 'files': files, 'bundle': bundle}, f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_file, cache_file)
@@ -0,0 +1,254 @@
+"""
+Per-device config history stored as keyframes plus line-level deltas.
+
+Device configs change a few lines at a time, so keeping a full copy per
+snapshot wastes space. The history records one version per device only when
+its content changed: every ``keyframe_interval``-th version is stored whole,
+the others as a delta against the previous version (difflib opcodes, zlib
+compressed). Rebuilding any version replays at most ``keyframe_interval - 1``
+deltas on top of the nearest keyframe.
+
+The history lives in ``<snapshots>/.history/`` and is filled from the
+existing snapshots, in timestamp order, with the device names of
+collect_device_configs().
+"""
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import difflib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from tests.common.config_utils import list_snapshots, collect_device_configs
+from tests.common.snapshot_catalog import parse_snapshot_timestamp
+from tests.common.snapshot_readers import read_config_bytes
+
+HISTORY_DIR = '.history'
+HISTORY_NAME = 'history.sqlite'
+
+# Versions per device between two full copies
+KEYFRAME_INTERVAL = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    device TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    snapshot TEXT NOT NULL,
+    taken_at INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    added INTEGER NOT NULL,
+    removed INTEGER NOT NULL,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (device, seq)
+);
+CREATE INDEX IF NOT EXISTS versions_taken_at ON versions (device, taken_at);
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    taken_at INTEGER NOT NULL
+);
+"""
+
+# Version kinds: full copy, delta against the previous version, device absent
+KEYFRAME, DELTA, REMOVED = 'key', 'delta', 'removed'
+
+# One change point of a device: the snapshot it was first seen in, the kind
+# of record and the number of lines added/removed since the previous version
+HistoryVersion = namedtuple('HistoryVersion', ['snapshot', 'taken_at', 'kind', 'digest', 'added', 'removed'])
+
+
+def _split(data):
+    """Config bytes as lines with line endings; undecodable bytes survive the round trip."""
+    return data.decode('utf-8', errors='surrogateescape').splitlines(keepends=True)
+
+
+def _join(lines):
+    return ''.join(lines).encode('utf-8', errors='surrogateescape')
+
+
+def make_delta(old_lines, new_lines):
+    """Return (ops, added, removed) turning old_lines into new_lines.
+
+    ops is a list of ['c', i1, i2] (copy old lines i1:i2) and ['i', lines]
+    (insert new lines).
+    """
+    ops = []
+    added = removed = 0
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(['c', i1, i2])
+            continue
+        removed += i2 - i1
+        if j2 > j1:
+            ops.append(['i', new_lines[j1:j2]])
+            added += j2 - j1
+    return ops, added, removed
+
+
+def apply_delta(old_lines, ops):
+    """Rebuild the new lines from the old lines and make_delta() ops."""
+    lines = []
+    for op in ops:
+        if op[0] == 'c':
+            lines.extend(old_lines[op[1]:op[2]])
+        else:
+            lines.extend(op[1])
+    return lines
+
+
+class HistoryStore:
+    """SQLite-backed delta-chain history of every device under ``snapshots_base``.
+
+    Snapshots are appended in timestamp order; ones older than the last
+    recorded snapshot are skipped by sync(). Plain rollback journal, as for
+    the snapshot catalog.
+    """
+
+    def __init__(self, snapshots_base, keyframe_interval=KEYFRAME_INTERVAL):
+        self.snapshots_base = snapshots_base
+        self.keyframe_interval = keyframe_interval
+        self.path = os.path.join(snapshots_base, HISTORY_DIR, HISTORY_NAME)
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _heads(self):
+        """{device: (seq, kind, digest)} of the latest version of every device."""
+        rows = self._connect().execute(
+            'SELECT device, seq, kind, digest FROM versions v WHERE seq = '
+            '(SELECT MAX(seq) FROM versions WHERE device = v.device)'
+        )
+        return {device: (seq, kind, digest) for device, seq, kind, digest in rows}
+
+    def last_snapshot(self):
+        """(name, epoch) of the most recently recorded snapshot, or None."""
+        return self._connect().execute(
+            'SELECT name, taken_at FROM snapshots ORDER BY taken_at DESC, name DESC LIMIT 1'
+        ).fetchone()
+
+    def record_snapshot(self, name, snapshot_dir):
+        """Append the devices of one snapshot; returns the number of new versions."""
+        taken_at = int(parse_snapshot_timestamp(name).timestamp())
+        heads = self._heads()
+        rows = []
+        seen = set()
+
+        for device, path in collect_device_configs(snapshot_dir):
+            seen.add(device)
+            data = read_config_bytes(path)
+            digest = hashlib.sha1(data).hexdigest()
+            head = heads.get(device)
+            if head is not None and head[1] != REMOVED and head[2] == digest:
+                continue
+
+            seq = head[0] + 1 if head else 0
+            restarted = head is None or head[1] == REMOVED
+            old_lines = [] if restarted else _split(self._content(device, head[0]))
+            ops, added, removed = make_delta(old_lines, _split(data))
+            if restarted or seq % self.keyframe_interval == 0:
+                kind, payload = KEYFRAME, zlib.compress(data)
+            else:
+                kind, payload = DELTA, zlib.compress(json.dumps(ops).encode())
+            rows.append((device, seq, name, taken_at, kind, digest, added, removed, payload))
+
+        for device, (seq, kind, _) in heads.items():
+            if device not in seen and kind != REMOVED:
+                rows.append((device, seq + 1, name, taken_at, REMOVED, '', 0, 0, b''))
+
+        conn = self._connect()
+        with conn:
+            conn.executemany('INSERT INTO versions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            conn.execute('INSERT INTO snapshots VALUES (?, ?)', (name, taken_at))
+        return len(rows)
+
+    def sync(self):
+        """Record every snapshot newer than the last recorded one; returns (snapshots, versions)."""
+        last = self.last_snapshot()
+        pending = []
+        for name, snapshot_dir in list_snapshots(self.snapshots_base).items():
+            taken_at = parse_snapshot_timestamp(name)
+            if taken_at is None:
+                continue
+            if last is None or (int(taken_at.timestamp()), name) > (last[1], last[0]):
+                pending.append((taken_at, name, snapshot_dir))
+
+        versions = 0
+        for _, name, snapshot_dir in sorted(pending):
+            versions += self.record_snapshot(name, snapshot_dir)
+        return len(pending), versions
+
+    def devices(self):
+        """All devices with recorded history, sorted."""
+        return [row[0] for row in self._connect().execute('SELECT DISTINCT device FROM versions ORDER BY device')]
+
+    def timeline(self, device):
+        """Change points of ``device``, oldest first, as HistoryVersion tuples."""
+        rows = self._connect().execute(
+            'SELECT snapshot, taken_at, kind, digest, added, removed FROM versions '
+            'WHERE device = ? ORDER BY seq', (device,)
+        )
+        return [HistoryVersion(snapshot, datetime.fromtimestamp(taken_at, timezone.utc), kind, digest,
+                               added, removed)
+                for snapshot, taken_at, kind, digest, added, removed in rows]
+
+    def config_at(self, device, when=None, snapshot=None):
+        """Config bytes of ``device`` as of snapshot name or datetime ``when``.
+
+        Defaults to the latest version. Returns None if the device did not
+        exist (yet, or any more) at that point.
+        """
+        conn = self._connect()
+        if snapshot is not None:
+            row = conn.execute('SELECT taken_at FROM snapshots WHERE name = ?', (snapshot,)).fetchone()
+            if row is None:
+                return None
+            epoch = row[0]
+        elif when is not None:
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            epoch = int(when.timestamp())
+        else:
+            epoch = 2**63 - 1
+
+        row = conn.execute(
+            'SELECT seq, kind FROM versions WHERE device = ? AND taken_at <= ? '
+            'ORDER BY taken_at DESC, seq DESC LIMIT 1', (device, epoch)
+        ).fetchone()
+        if row is None or row[1] == REMOVED:
+            return None
+        return self._content(device, row[0])
+
+    def _content(self, device, seq):
+        """Rebuild version ``seq`` from its keyframe and the deltas after it."""
+        rows = self._connect().execute(
+            'SELECT kind, payload FROM versions WHERE device = ? AND seq <= ? AND seq >= '
+            "(SELECT MAX(seq) FROM versions WHERE device = ? AND seq <= ? AND kind = 'key') "
+            'ORDER BY seq', (device, seq, device, seq)
+        ).fetchall()
+
+        lines = None
+        for kind, payload in rows:
+            if kind == KEYFRAME:
+                lines = _split(zlib.decompress(payload))
+            else:
+                lines = apply_delta(lines, json.loads(zlib.decompress(payload)))
+        return _join(lines)
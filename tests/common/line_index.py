@@ -0,0 +1,182 @@
+"""
+Inverted line index of a snapshot: normalized line -> devices that have it.
+
+Answers fleet-wide "which devices still have X" questions without reading
+any config. The index of a snapshot is stored under the cache directory
+and records the path, mtime and size of every config it was built from; it
+is only used while the snapshot still has exactly those configs. Lines are
+normalized the way golden fragments are (whitespace collapsed) and
+lowercased; posting lists are arrays of device numbers.
+"""
+import os
+import sqlite3
+import hashlib
+from array import array
+
+from tests.common.config_utils import collect_device_configs, read_file
+from tests.common.snapshot_readers import source_stat
+
+# Stored as the database user_version; bump when the schema changes
+INDEX_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lines (
+    line TEXT PRIMARY KEY,
+    postings BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def normalize_line(line):
+    """Index form of a config line: whitespace collapsed, lowercased."""
+    return ' '.join(line.split()).lower()
+
+
+def index_path(cache_dir, snapshot_dir):
+    """Cache file holding the line index of a snapshot directory or archive."""
+    key = hashlib.sha1(os.path.abspath(snapshot_dir).encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"line_index_{key}.sqlite")
+
+
+def snapshot_signature(devices):
+    """[(device, path, mtime_ns, size)] of (device, path) pairs, as stored in the index.
+
+    Archive members carry the stat of their archive.
+    """
+    signature = []
+    for device, path in devices:
+        stat = source_stat(path)
+        signature.append((device, str(path), stat.st_mtime_ns, stat.st_size))
+    return signature
+
+
+def build_line_index(cache_dir, snapshot_dir):
+    """(Re)build the line index of a snapshot; returns (devices, distinct lines)."""
+    devices = collect_device_configs(snapshot_dir)
+    signature = snapshot_signature(devices)
+    postings = {}
+    for device_id, (device, path) in enumerate(devices):
+        for line in {normalize_line(line) for line in read_file(path)}:
+            if line:
+                postings.setdefault(line, array('I')).append(device_id)
+
+    path = index_path(cache_dir, snapshot_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = f"{path}.{os.getpid()}.tmp"
+    conn = sqlite3.connect(tmp_file)
+    try:
+        conn.executescript(SCHEMA)
+        conn.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+        with conn:
+            conn.executemany('INSERT INTO devices VALUES (?, ?, ?, ?, ?)',
+                             [(device_id,) + entry for device_id, entry in enumerate(signature)])
+            conn.executemany('INSERT INTO lines VALUES (?, ?)',
+                             ((line, ids.tobytes()) for line, ids in sorted(postings.items())))
+    finally:
+        conn.close()
+    os.replace(tmp_file, path)
+    return len(devices), len(postings)
+
+
+class LineIndex:
+    """Read-only view of a snapshot's line index."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self._devices = dict(self._conn.execute('SELECT id, name FROM devices'))
+        self._indexed = set(self._devices.values())
+        self._containing = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_current(self, signature):
+        """True if the index was built from exactly the configs of ``signature``."""
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+            return False
+        stored = self._conn.execute('SELECT name, path, mtime_ns, size FROM devices ORDER BY id').fetchall()
+        return stored == signature
+
+    def close(self):
+        self._conn.close()
+
+    def _names(self, postings):
+        ids = array('I')
+        ids.frombytes(postings)
+        return [self._devices[device_id] for device_id in ids]
+
+    def query(self, line):
+        """Sorted devices having exactly this (normalized) line."""
+        row = self._conn.execute('SELECT postings FROM lines WHERE line = ?', (normalize_line(line),)).fetchone()
+        return sorted(self._names(row[0])) if row else []
+
+    def search(self, text, mode='contains'):
+        """{line: sorted devices} for lines starting with (``prefix``) or containing ``text``."""
+        text = normalize_line(text)
+        if mode == 'prefix':
+            # Range scan on the primary key
+            rows = self._conn.execute(
+                'SELECT line, postings FROM lines WHERE line >= ? AND line < ?', (text, text + '\U0010ffff')
+            )
+        else:
+            rows = self._conn.execute('SELECT line, postings FROM lines WHERE instr(line, ?) > 0', (text,))
+        return {line: sorted(self._names(postings)) for line, postings in rows}
+
+    def devices_containing(self, text):
+        """Set of devices with a line containing ``text``; cached per text."""
+        text = normalize_line(text)
+        devices = self._containing.get(text)
+        if devices is None:
+            devices = self._containing[text] = {
+                device for names in self.search(text).values() for device in names
+            }
+        return devices
+
+    def may_contain(self, device, pattern):
+        """False if ``device`` cannot contain the (multi-line) pattern text.
+
+        Every line of a pattern found in a config lies within one config line,
+        so a device lacking the longest pattern line cannot match. Devices
+        missing from the index may contain anything.
+        """
+        key = max(pattern.split('\n'), key=len).strip()
+        if not key or device not in self._indexed:
+            return True
+        return device in self.devices_containing(key)
+
+
+def load_line_index(cache_dir, snapshot_dir, build=False):
+    """Open the line index of a snapshot; (re)builds it first if missing or stale and ``build``.
+
+    Returns None when there is no index, or it no longer matches the
+    snapshot's configs and ``build`` is false.
+    """
+    path = index_path(cache_dir, snapshot_dir)
+    if os.path.isfile(path):
+        try:
+            index = LineIndex(path)
+        except sqlite3.Error:
+            index = None
+        if index is not None:
+            try:
+                if index.is_current(snapshot_signature(collect_device_configs(snapshot_dir))):
+                    return index
+            except sqlite3.Error:
+                pass
+            index.close()
+
+    if not build:
+        return None
+    build_line_index(cache_dir, snapshot_dir)
+    return LineIndex(path)
@@ -0,0 +1,59 @@
+"""
+Fleet-wide line interning.
+
+Most config lines (``ntp server ...``, ``logging level ...``, interface
+boilerplate) are identical across devices. A LineTable stores each distinct
+line once and gives it an integer id, so a device becomes an ``array('I')``
+of ids and memory follows the number of unique lines rather than the total.
+"""
+from array import array
+
+
+class LineTable:
+    """Bidirectional line <-> id map, with the id of each line's lowercased form.
+
+    Lines are interned exactly as read (no whitespace normalization), so
+    decoded configs are identical to the original lines.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._lines = []
+        self._folded = array('I')
+
+    def __len__(self):
+        return len(self._lines)
+
+    def intern(self, line):
+        """Return the id of ``line``, adding it on first sight."""
+        line_id = self._ids.get(line)
+        if line_id is None:
+            line_id = self._ids[line] = len(self._lines)
+            self._lines.append(line)
+            self._folded.append(line_id)
+            folded = line.lower()
+            if folded != line:
+                self._folded[line_id] = self.intern(folded)
+        return line_id
+
+    def lookup(self, line):
+        """Return the id of ``line``, or None if it was never interned."""
+        return self._ids.get(line)
+
+    def line(self, line_id):
+        return self._lines[line_id]
+
+    def encode(self, lines):
+        """Intern every line; returns their ids as a compact array."""
+        intern = self.intern
+        return array('I', [intern(line) for line in lines])
+
+    def decode(self, ids):
+        """Lines for an array of ids (the interned strings, not copies)."""
+        lines = self._lines
+        return [lines[line_id] for line_id in ids]
+
+    def folded_ids(self, ids):
+        """Set of ids of the lowercased lines, for case-insensitive membership checks."""
+        folded = self._folded
+        return {folded[line_id] for line_id in ids}
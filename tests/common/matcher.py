@@ -0,0 +1,260 @@
+"""
+Multi-pattern matching for golden config fragments.
+
+Compiles fragments from every category into one Aho-Corasick automaton so
+each device config is scanned once, however many fragments are loaded.
+Uses the pyahocorasick C extension (see requirements.txt); without it each
+distinct fragment is looked up with a C-level substring search instead,
+with the same results.
+
+Templates with placeholders (see tests.common.templates) enter the
+automaton as their literal anchor; their regex only runs on configs where
+the anchor was found.
+"""
+import re
+from collections import namedtuple
+
+from tests.common.templates import (
+    is_template, compile_template, compile_byte_template, literal_anchor, variables
+)
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - optional dependency
+    ahocorasick = None
+
+
+# One matched fragment: ``content`` is the fragment text, or for a template
+# the config text it matched; ``variables`` holds the captured placeholders
+Match = namedtuple('Match', ['pattern_name', 'content', 'variables'])
+
+
+class FragmentMatcher:
+    """Aho-Corasick automaton over lowercased fragment contents.
+
+    Fragments are registered per group (e.g. ``('forbidden', 'debug')``) and
+    matches are reported as Match tuples, in the order the fragments were
+    added.
+    """
+
+    def __init__(self):
+        self._entries = []      # (group, pattern_name, content) per pattern id
+        self._needles = {}      # lowercased content (or template anchor) -> [pattern ids]
+        self._always = []       # pattern ids with empty content or anchor (always candidates)
+        self._templates = {}    # pattern id -> compiled template regex
+        self._automaton = None
+        self._edge_automaton = None   # first and last lines of multi-line needles
+        self._needle_edges = None     # multi-line needle -> edge ids
+        self._byte_patterns = None
+        self._byte_templates = None
+        self._line_cache = None   # (LineTable, {line id: (pattern ids, edge ids)}, {needle: inner line ids})
+
+    def __getstate__(self):
+        # The per-session line cache is not part of the compiled matcher, and
+        # the automata depend on whether pyahocorasick is installed where
+        # the matcher is loaded, so they are rebuilt after unpickling
+        state = self.__dict__.copy()
+        state['_automaton'] = None
+        state['_edge_automaton'] = None
+        state['_line_cache'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.build()
+
+    def add_fragments(self, group, fragments):
+        """Register a {pattern_name: content} dict under ``group``."""
+        for pattern_name, pattern_content in fragments.items():
+            pattern_id = len(self._entries)
+            content = pattern_content.strip()
+            self._entries.append((group, pattern_name, content))
+            if is_template(content):
+                self._templates[pattern_id] = compile_template(content, pattern_name)
+                needle = literal_anchor(content)
+            else:
+                needle = content.lower()
+            if needle:
+                self._needles.setdefault(needle, []).append(pattern_id)
+            else:
+                self._always.append(pattern_id)
+        self._automaton = None
+        self._edge_automaton = None
+        self._byte_patterns = None
+        self._byte_templates = None
+        self._line_cache = None
+
+    def build(self):
+        """Compile the automaton; called lazily by scan() if needed."""
+        edges = {}
+        self._needle_edges = {}
+        for needle in self._needles:
+            if '\n' in needle:
+                lines = needle.split('\n')
+                self._needle_edges[needle] = frozenset(
+                    edges.setdefault(line, len(edges)) for line in (lines[0], lines[-1])
+                )
+        self._automaton = _compile_needles(self._needles.items())
+        self._edge_automaton = _compile_needles((line, (edge_id,)) for line, edge_id in edges.items())
+        return self
+
+    def scan(self, folded_text, text=None):
+        """Return {group: [Match, ...]} for one lowercased config.
+
+        Templates capture their variables from ``text``, the config as read,
+        when given (otherwise from the lowercased text).
+        """
+        if self._automaton is None:
+            self.build()
+
+        found = set(self._always)
+        found.update(_find(self._automaton, folded_text))
+
+        return self._group(found, self._templates, lambda: text if text is not None else folded_text)
+
+    def scan_buffer(self, buffer):
+        """Like scan(), but on raw config bytes such as an mmap, without decoding.
+
+        Case-insensitive for ASCII; line breaks inside a fragment also match
+        CRLF line endings. All fragments are searched in one pass over the
+        buffer.
+        """
+        if self._byte_patterns is None:
+            self._byte_patterns = _compile_byte_needles(self._needles)
+
+        if self._byte_templates is None:
+            self._byte_templates = {
+                pattern_id: compile_byte_template(self._entries[pattern_id][2]) for pattern_id in self._templates
+            }
+
+        found = set(self._always)
+        regex, group_ids = self._byte_patterns
+        if regex is not None:
+            remaining = set(range(len(group_ids)))
+            for match in regex.finditer(buffer):
+                hits = [index for index in remaining if match.start(index + 1) != -1]
+                for index in hits:
+                    found.update(group_ids[index])
+                remaining.difference_update(hits)
+                if not remaining:
+                    break
+        return self._group(found, self._byte_templates, lambda: buffer)
+
+    def scan_interned(self, ids, table):
+        """Like scan(), for a config stored as LineTable ``ids``.
+
+        A single-line fragment can only match inside one config line, so each
+        distinct line is searched once per table, however many devices share
+        it, and a device's matches are the union over its lines. A multi-line
+        fragment must have its inner lines as whole config lines (an integer
+        subset check) and its first and last lines inside some config line
+        before the config text is searched for it.
+        """
+        if self._automaton is None:
+            self.build()
+        if self._line_cache is None or self._line_cache[0] is not table:
+            self._line_cache = (table, {}, {})
+        _, line_hits, inner_ids = self._line_cache
+
+        found = set(self._always)
+        found_edges = set()
+        folded_ids = table.folded_ids(ids)
+        for line_id in folded_ids:
+            hits = line_hits.get(line_id)
+            if hits is None:
+                line = table.line(line_id)
+                hits = line_hits[line_id] = (
+                    tuple(_find(self._automaton, line)), tuple(_find(self._edge_automaton, line))
+                )
+            found.update(hits[0])
+            found_edges.update(hits[1])
+
+        text = None
+        folded_text = None
+        for needle, pattern_ids in self._needles.items():
+            if '\n' not in needle:
+                continue
+            required = inner_ids.get(needle)
+            if required is None:
+                required = inner_ids[needle] = frozenset(table.intern(line) for line in needle.split('\n')[1:-1])
+            if required <= folded_ids and self._needle_edges[needle] <= found_edges:
+                if folded_text is None:
+                    text = '\n'.join(table.decode(ids))
+                    folded_text = text.lower()
+                if needle in folded_text:
+                    found.update(pattern_ids)
+
+        # Decoded at most once per device, for fragments and templates alike
+        return self._group(found, self._templates, lambda: text if text is not None else '\n'.join(table.decode(ids)))
+
+    def _group(self, found, templates, get_text):
+        """Group found pattern ids as Match tuples, verifying template candidates.
+
+        ``get_text()`` returns the config for template regexes; it is only
+        called when a template's anchor was found.
+        """
+        matches = {}
+        text = None
+        for pattern_id in sorted(found):
+            group, pattern_name, content = self._entries[pattern_id]
+            captured = {}
+            regex = templates.get(pattern_id)
+            if regex is not None:
+                if text is None:
+                    text = get_text()
+                match = regex.search(text)
+                if match is None:
+                    continue
+                content = match.group(0)
+                if isinstance(content, bytes):
+                    content = content.decode('utf-8', errors='ignore')
+                content = content.strip()
+                captured = variables(match)
+            matches.setdefault(group, []).append(Match(pattern_name, content, captured))
+        return matches
+
+
+def _compile_byte_needles(needles):
+    """(regex, [pattern ids per group]) finding every needle in one pass over bytes.
+
+    The leading alternation stops at each offset where some needle starts;
+    one optional lookahead group per needle then records every needle
+    starting there, so overlapping needles and needles that prefix others
+    are all reported. The regex is None without needles.
+    """
+    if not needles:
+        return None, []
+    sources = [
+        rb'\r?\n'.join(re.escape(line.encode()) for line in needle.split('\n'))
+        for needle in needles
+    ]
+    source = b'(?=' + b'|'.join(sources) + b')' + b''.join(b'(?:(?=(' + s + b')))?' for s in sources)
+    return re.compile(source, re.IGNORECASE), list(needles.values())
+
+
+def _compile_needles(needles):
+    """Searcher for _find() over (needle, ids) pairs.
+
+    An Aho-Corasick automaton, or the pairs themselves without pyahocorasick.
+    """
+    if ahocorasick is None:
+        return tuple(needles)
+    automaton = ahocorasick.Automaton()
+    for needle, ids in needles:
+        automaton.add_word(needle, tuple(ids))
+    automaton.make_automaton()
+    return automaton
+
+
+def _find(searcher, text):
+    """Set of the ids of every needle of a _compile_needles() searcher found in text."""
+    if ahocorasick is None:
+        return _search(searcher, text)
+    if not len(searcher):
+        return set()
+    return {found_id for _, ids in searcher.iter(text) for found_id in ids}
+
+
+def _search(needles, text):
+    """Pattern ids of the (needle, pattern ids) pairs found in text, one substring search each."""
+    return {pattern_id for needle, pattern_ids in needles if needle in text for pattern_id in pattern_ids}
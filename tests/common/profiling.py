@@ -0,0 +1,146 @@
+"""
+Opt-in instrumentation of the compliance pipeline (--drift-profile).
+
+Code paths wrap their work in ``with stage('match', category=..., device=...)``.
+When profiling is enabled, each stage records wall time, call count, bytes
+read and peak traced memory (tracemalloc), aggregated per stage, per category
+and per device. When disabled, stage() returns a shared no-op context manager,
+so instrumented code pays one function call.
+
+Only the main process is profiled; with --workers > 1 the per-device work
+of the pool is covered by the enclosing stage as a whole.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+_NULL = nullcontext()
+
+# Active Profiler, or None when profiling is disabled
+_profiler = None
+
+
+class Profiler:
+    """Aggregated timings: {'stages'|'categories'|'devices': {name: totals}}."""
+
+    def __init__(self, trace_memory=True):
+        self.tables = {'stages': {}, 'categories': {}, 'devices': {}}
+        self.trace_memory = trace_memory
+        self._frames = []
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+
+    def stage(self, name, category=None, device=None):
+        return _Stage(self, name, category, device)
+
+    def _enter(self, frame):
+        if self.trace_memory:
+            # Fold the peak reached so far into the enclosing stages, then restart it
+            peak = tracemalloc.get_traced_memory()[1]
+            for outer in self._frames:
+                outer.peak = max(outer.peak, peak)
+            tracemalloc.reset_peak()
+        self._frames.append(frame)
+
+    def _exit(self, frame, elapsed):
+        self._frames.pop()
+        if self.trace_memory:
+            frame.peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+            for outer in self._frames:
+                outer.peak = max(outer.peak, frame.peak)
+
+        for table, key in frame.keys:
+            totals = self.tables[table].get(key)
+            if totals is None:
+                totals = self.tables[table][key] = {'calls': 0, 'seconds': 0.0, 'bytes': 0, 'peak_memory': 0}
+            totals['calls'] += 1
+            totals['seconds'] += elapsed
+            totals['bytes'] += frame.bytes
+            totals['peak_memory'] = max(totals['peak_memory'], frame.peak)
+
+    def add_bytes(self, count):
+        for frame in self._frames:
+            frame.bytes += count
+
+    def summary(self, top=10):
+        """Summary table lines: all stages and categories, the ``top`` slowest devices."""
+        lines = []
+        for table, limit in (('stages', None), ('categories', None), ('devices', top)):
+            rows = sorted(self.tables[table].items(), key=lambda item: item[1]['seconds'], reverse=True)
+            if not rows:
+                continue
+            title = table if limit is None or len(rows) <= limit else f"{table} (slowest {limit})"
+            lines.append(f"{title:<40} {'calls':>8} {'seconds':>10} {'MB read':>9} {'peak MB':>9}")
+            for key, totals in rows[:limit]:
+                lines.append(
+                    f"  {key:<38} {totals['calls']:>8} {totals['seconds']:>10.3f} "
+                    f"{totals['bytes'] / 2**20:>9.1f} {totals['peak_memory'] / 2**20:>9.1f}"
+                )
+        return lines
+
+    def write(self, path):
+        """Write all tables as JSON."""
+        with open(path, 'w') as f:
+            json.dump(self.tables, f, indent=2, sort_keys=True)
+
+    def close(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class _Stage:
+    __slots__ = ('profiler', 'keys', 'start', 'bytes', 'peak')
+
+    def __init__(self, profiler, name, category, device):
+        self.profiler = profiler
+        self.keys = [('stages', name)]
+        if category is not None:
+            self.keys.append(('categories', category))
+        if device is not None:
+            self.keys.append(('devices', device))
+        self.bytes = 0
+        self.peak = 0
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler._exit(self, time.perf_counter() - self.start)
+
+
+def enable(trace_memory=True):
+    """Start profiling; returns the active Profiler."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(trace_memory)
+    return _profiler
+
+
+def disable():
+    """Stop profiling; returns the Profiler that was active, if any."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.close()
+    return profiler
+
+
+def active():
+    """The active Profiler, or None when profiling is disabled."""
+    return _profiler
+
+
+def stage(name, category=None, device=None):
+    """Context manager timing one stage; a no-op unless profiling is enabled."""
+    if _profiler is None:
+        return _NULL
+    return _profiler.stage(name, category, device)
+
+
+def add_bytes(count):
+    """Count bytes read towards the stages currently running."""
+    if _profiler is not None:
+        _profiler.add_bytes(count)
@@ -0,0 +1,102 @@
+"""
+On-disk cache of per-device compliance results.
+
+Most devices do not change between snapshots. Results are stored per device
+together with the hash of its config content, the hash of the golden
+template set and the evaluation options; when all of them match a later run,
+the stored rows are reused instead of matching the config again, with their
+timestamps and config path updated.
+"""
+import json
+import sqlite3
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    device TEXT NOT NULL,
+    options TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    golden_hash TEXT NOT NULL,
+    results TEXT NOT NULL,
+    PRIMARY KEY (device, options)
+)
+"""
+
+
+def rebase_results(results, old_path, new_path):
+    """Copy of one device's results for reuse in a later run.
+
+    Rows get the current time in their Timestamp column, and failure
+    messages name ``new_path`` instead of ``old_path``, the config file the
+    results were computed from.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    old_path, new_path = str(old_path), str(new_path)
+    rebased = {}
+    for key, (rows, failure) in results.items():
+        if failure and old_path != new_path:
+            failure = failure.replace(old_path, new_path)
+        rebased[key] = ([[timestamp] + list(row[1:]) for row in rows], failure)
+    return rebased
+
+
+class ResultCache:
+    """SQLite-backed map of device -> last evaluate_categories() results.
+
+    Only the latest entry per (device, options) is kept, so the cache stays
+    the size of the fleet. Writes are batched until flush().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._pending = []
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(SCHEMA)
+        return self._conn
+
+    def get(self, device, content_hash, golden_hash, options, path):
+        """Return cached {(kind, category): (rows, failure)} or None on a miss.
+
+        Reused results are rebased onto ``path``, the device's current config
+        file (see rebase_results()).
+        """
+        row = self._connect().execute(
+            'SELECT results FROM results WHERE device = ? AND options = ? '
+            'AND content_hash = ? AND golden_hash = ?',
+            (device, options, content_hash, golden_hash)
+        ).fetchone()
+        if row is None:
+            return None
+
+        cached = json.loads(row[0])
+        results = {
+            (kind, category): (rows, failure) for kind, category, rows, failure in cached['results']
+        }
+        return rebase_results(results, cached['path'], path)
+
+    def put(self, device, content_hash, golden_hash, options, results, path):
+        """Queue results of one device, computed from config file ``path``, for the next flush()."""
+        payload = json.dumps({'path': str(path), 'results': [
+            [kind, category, rows, failure] for (kind, category), (rows, failure) in results.items()
+        ]})
+        self._pending.append((device, options, content_hash, golden_hash, payload))
+
+    def flush(self):
+        """Write queued results in one transaction."""
+        if not self._pending:
+            return
+        conn = self._connect()
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)', self._pending)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,310 @@
+"""
+Persistent catalog of the snapshots under a snapshots base directory.
+
+Listing the base directory and sorting names on every run gets slow with
+tens of thousands of snapshots on network storage. The catalog records each
+snapshot's parsed timestamp and its devices (path, size, content hash) in a
+SQLite file next to the snapshots, with an index on the timestamp for
+"latest", "nearest to T" and range lookups.
+
+The catalog is opt-in: it is created by ``cfg_drift.py catalog sync`` and
+from then on kept current incrementally, by ``ingest`` and whenever the base
+directory's mtime shows that entries were added or removed. Snapshots (and
+the base directory) that changed within SETTLE_NS of being catalogued may
+still be written to, possibly within the same mtime tick; they are re-read
+on every refresh until they have been quiet for that long.
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timezone, timedelta
+
+from tests.common.snapshot_readers import open_config, archive_suffix
+from tests.common.snapshot_store import read_manifest, resolve_manifest
+
+# Own sub-directory, so journal files never touch the base directory's mtime
+CATALOG_DIR = '.catalog'
+CATALOG_NAME = 'snapshots.sqlite'
+
+# How long after its last change a snapshot is re-read on refresh, for
+# writers that copy a snapshot file by file
+SETTLE_NS = 60 * 10**9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    taken_at INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    mtime_ns INTEGER,
+    synced_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS snapshots_taken_at ON snapshots (taken_at);
+CREATE TABLE IF NOT EXISTS devices (
+    snapshot TEXT NOT NULL,
+    device TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (snapshot, device)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# YYYY-MM-DDTHH:MM:SS[.fff][Z|+HH:MM]; '-' is accepted in the time for
+# filesystems that do not allow ':' in names
+TIMESTAMP = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})T(\d{2})[:-](\d{2})[:-](\d{2})(?:\.\d+)?'
+    r'(Z|[+-]\d{2}:?\d{2})?$'
+)
+
+# One catalogued snapshot: timestamp name, UTC datetime and full path
+CatalogEntry = namedtuple('CatalogEntry', ['name', 'taken_at', 'path'])
+
+# One device of a catalogued snapshot
+CatalogDevice = namedtuple('CatalogDevice', ['device', 'path', 'size', 'digest'])
+
+
+def parse_snapshot_timestamp(name):
+    """Parse a snapshot name into an aware UTC datetime; None if it is not a timestamp.
+
+    Names without a zone are taken as UTC.
+    """
+    match = TIMESTAMP.match(name)
+    if not match:
+        return None
+    zone = match.group(7)
+    offset = timedelta(0)
+    if zone and zone != 'Z':
+        sign = -1 if zone[0] == '-' else 1
+        digits = zone[1:].replace(':', '')
+        offset = sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+    try:
+        taken_at = datetime(*(int(part) for part in match.groups()[:6]), tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    return taken_at - offset
+
+
+def _epoch(when):
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return int(when.timestamp())
+
+
+class SnapshotCatalog:
+    """SQLite index of snapshots under ``snapshots_base``.
+
+    Plain rollback journal (not WAL), since snapshots often live on NFS.
+    """
+
+    def __init__(self, snapshots_base):
+        self.snapshots_base = snapshots_base
+        self.path = os.path.join(snapshots_base, CATALOG_DIR, CATALOG_NAME)
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.executescript(SCHEMA)
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(snapshots)')}
+            if 'mtime_ns' not in columns:
+                # Catalogs from before change tracking: their snapshots count as settled
+                with self._conn:
+                    self._conn.execute('ALTER TABLE snapshots ADD COLUMN mtime_ns INTEGER')
+                    self._conn.execute('ALTER TABLE snapshots ADD COLUMN synced_ns INTEGER')
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _entry(self, row):
+        if row is None:
+            return None
+        name, taken_at, entry = row
+        return CatalogEntry(name, datetime.fromtimestamp(taken_at, timezone.utc),
+                            os.path.join(self.snapshots_base, entry))
+
+    def add(self, entry):
+        """Record the snapshot directory or archive ``entry`` (a name in the base dir).
+
+        Returns the CatalogEntry, or None if ``entry`` is not a timestamped snapshot.
+        """
+        # Imported here: config_utils itself looks snapshots up through the catalog
+        from tests.common.config_utils import collect_device_configs
+
+        suffix = archive_suffix(entry)
+        name = entry[:-len(suffix)] if suffix else entry
+        taken_at = parse_snapshot_timestamp(name)
+        snapshot_path = os.path.join(self.snapshots_base, entry)
+        if taken_at is None or not os.path.exists(snapshot_path):
+            return None
+
+        synced_ns = time.time_ns()
+        manifest = read_manifest(snapshot_path) if not suffix else None
+        if manifest is not None:
+            # Manifest digests are content hashes already; blobs are plain files
+            devices = [(device, path, os.path.getsize(path), manifest[device])
+                       for device, path in resolve_manifest(snapshot_path, manifest)]
+        else:
+            devices = [(device, path) + _size_and_digest(path)
+                       for device, path in collect_device_configs(snapshot_path)]
+
+        mtime_ns = _newest_mtime(snapshot_path, [path for _, path, _, _ in devices])
+
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO snapshots (name, taken_at, entry, mtime_ns, synced_ns) '
+                         'VALUES (?, ?, ?, ?, ?)', (name, _epoch(taken_at), entry, mtime_ns, synced_ns))
+            conn.execute('DELETE FROM devices WHERE snapshot = ?', (name,))
+            conn.executemany('INSERT INTO devices VALUES (?, ?, ?, ?, ?)', [
+                (name, device, os.path.relpath(path, self.snapshots_base), size, digest)
+                for device, path, size, digest in devices
+            ])
+        return self.get(name)
+
+    def sync(self):
+        """Bring the catalog in line with the base directory; returns (added, removed).
+
+        Only snapshots that are new since the last sync, or still unsettled,
+        are read and hashed.
+        """
+        conn = self._connect()
+        synced_ns = time.time_ns()
+        base_mtime = os.stat(self.snapshots_base).st_mtime_ns
+        if synced_ns - base_mtime < SETTLE_NS:
+            # Entries may still arrive within the same mtime tick: list again next refresh
+            base_mtime = -1
+        entries = {}
+        for entry in os.listdir(self.snapshots_base):
+            if entry.startswith('.'):
+                continue
+            suffix = archive_suffix(entry)
+            entries[entry[:-len(suffix)] if suffix else entry] = entry
+
+        known = dict(conn.execute('SELECT name, entry FROM snapshots'))
+        unsettled = self._unsettled()
+        added = sum(
+            self.add(entry) is not None
+            for name, entry in sorted(entries.items()) if known.get(name) != entry or name in unsettled
+        )
+        removed = [name for name in known if name not in entries]
+        with conn:
+            conn.executemany('DELETE FROM snapshots WHERE name = ?', [(name,) for name in removed])
+            conn.executemany('DELETE FROM devices WHERE snapshot = ?', [(name,) for name in removed])
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('base_mtime_ns', ?)", (str(base_mtime),))
+        return added, len(removed)
+
+    def _unsettled(self):
+        """Names of snapshots catalogued less than SETTLE_NS after their last change."""
+        rows = self._connect().execute('SELECT name FROM snapshots WHERE synced_ns - mtime_ns < ?', (SETTLE_NS,))
+        return {name for name, in rows}
+
+    def refresh(self):
+        """sync() only if the base directory changed since the last sync or a snapshot is unsettled.
+
+        One stat call and one query when nothing changed.
+        """
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'base_mtime_ns'").fetchone()
+        if row is None or int(row[0]) != os.stat(self.snapshots_base).st_mtime_ns or self._unsettled():
+            self.sync()
+
+    def get(self, name):
+        """Return the CatalogEntry of snapshot ``name``, or None."""
+        return self._entry(self._connect().execute(
+            'SELECT name, taken_at, entry FROM snapshots WHERE name = ?', (name,)
+        ).fetchone())
+
+    def latest(self):
+        """Most recent snapshot, or None for an empty catalog."""
+        return self._entry(self._connect().execute(
+            'SELECT name, taken_at, entry FROM snapshots ORDER BY taken_at DESC, name DESC LIMIT 1'
+        ).fetchone())
+
+    def nearest(self, when):
+        """Snapshot taken closest to datetime ``when`` (naive values are UTC); ties go to the earlier one."""
+        epoch = _epoch(when)
+        conn = self._connect()
+        before = conn.execute(
+            'SELECT name, taken_at, entry FROM snapshots WHERE taken_at <= ? '
+            'ORDER BY taken_at DESC, name DESC LIMIT 1', (epoch,)
+        ).fetchone()
+        after = conn.execute(
+            'SELECT name, taken_at, entry FROM snapshots WHERE taken_at > ? '
+            'ORDER BY taken_at, name LIMIT 1', (epoch,)
+        ).fetchone()
+        if before is None or (after is not None and after[1] - epoch < epoch - before[1]):
+            return self._entry(after)
+        return self._entry(before)
+
+    def range(self, start=None, end=None):
+        """Snapshots with start <= timestamp <= end, oldest first; either bound may be None."""
+        query = 'SELECT name, taken_at, entry FROM snapshots WHERE taken_at >= ? AND taken_at <= ? '
+        bounds = (_epoch(start) if start else -2**63, _epoch(end) if end else 2**63 - 1)
+        rows = self._connect().execute(query + 'ORDER BY taken_at, name', bounds)
+        return [self._entry(row) for row in rows]
+
+    def devices(self, name):
+        """Devices recorded for snapshot ``name``, sorted by device."""
+        rows = self._connect().execute(
+            'SELECT device, path, size, digest FROM devices WHERE snapshot = ? ORDER BY device', (name,)
+        )
+        return [CatalogDevice(device, os.path.join(self.snapshots_base, path), size, digest)
+                for device, path, size, digest in rows]
+
+
+def _newest_mtime(snapshot_path, paths):
+    """Newest mtime_ns of a snapshot entry and of its config files.
+
+    Files written in place do not touch their directory's mtime. Archive
+    members are not files of their own and only count through the archive.
+    """
+    newest = os.stat(snapshot_path).st_mtime_ns
+    for path in paths:
+        try:
+            newest = max(newest, os.stat(path).st_mtime_ns)
+        except OSError:
+            continue
+    return newest
+
+
+def _size_and_digest(path):
+    """(size, SHA-1) of a config's decompressed content in one read."""
+    digest = hashlib.sha1()
+    size = 0
+    with open_config(path) as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def open_catalog(snapshots_base):
+    """Return the refreshed catalog of ``snapshots_base``, or None if there is none.
+
+    Also None when the catalog cannot be read or updated (e.g. a read-only
+    share), so callers fall back to scanning the directory.
+    """
+    catalog = SnapshotCatalog(snapshots_base)
+    if not os.path.isfile(catalog.path):
+        return None
+    try:
+        catalog.refresh()
+    except (sqlite3.Error, OSError):
+        catalog.close()
+        return None
+    return catalog
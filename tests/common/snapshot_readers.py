@@ -0,0 +1,163 @@
+"""
+Readers for compressed and archived device snapshots.
+
+Device configs may be stored as plain ``.cfg``, ``.cfg.gz`` or ``.cfg.zst``
+files, and a whole snapshot may be a single tar or zip archive. Configs are
+decompressed as a stream while they are read; nothing is extracted to disk.
+A config inside an archive is addressed as ``<archive path>!<member name>``.
+
+Uses the zstandard package for ``.cfg.zst`` when installed.
+"""
+import os
+import gzip
+import hashlib
+import tarfile
+import zipfile
+from contextlib import contextmanager, ExitStack
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Separates an archive path from the config member inside it
+MEMBER_SEP = '!'
+
+# Whole-snapshot archive formats, e.g. snapshots/2025-01-01T12:00:00Z.tar.gz
+ARCHIVE_SUFFIXES = ('.tar.gz', '.tgz', '.tar', '.zip')
+
+
+def _read_zstd(f):
+    if zstandard is None:
+        raise OSError("Reading .cfg.zst snapshots requires the 'zstandard' package")
+    return zstandard.ZstdDecompressor().stream_reader(f)
+
+
+# Config file suffix -> function wrapping an open binary file in a decoded stream
+CONFIG_READERS = {
+    '.cfg': lambda f: f,
+    '.cfg.gz': lambda f: gzip.GzipFile(fileobj=f),
+    '.cfg.zst': _read_zstd,
+}
+
+
+def register_reader(suffix, reader):
+    """Read device configs ending in ``suffix`` through ``reader(binary_file)``."""
+    CONFIG_READERS[suffix] = reader
+
+
+def config_suffix(filename):
+    """Return the longest registered config suffix of ``filename``, or None."""
+    matches = [suffix for suffix in CONFIG_READERS if filename.endswith(suffix)]
+    return max(matches, key=len) if matches else None
+
+
+def device_name(filename):
+    """Device name of a config file: its base name without the config suffix."""
+    name = os.path.basename(filename)
+    return name[:-len(config_suffix(name))]
+
+
+def archive_suffix(filename):
+    """Return the archive suffix of ``filename``, or None if it is not an archive."""
+    for suffix in ARCHIVE_SUFFIXES:
+        if filename.endswith(suffix):
+            return suffix
+    return None
+
+
+def split_member(path):
+    """Split ``archive!member`` into (archive, member); plain paths give (path, None)."""
+    for suffix in ARCHIVE_SUFFIXES:
+        marker = suffix + MEMBER_SEP
+        index = path.find(marker)
+        if index != -1:
+            return path[:index + len(suffix)], path[index + len(marker):]
+    return path, None
+
+
+def is_plain_file(path):
+    """True for an uncompressed config on disk, which can be mmapped or stat'ed directly."""
+    return split_member(path)[1] is None and config_suffix(path) in (None, '.cfg')
+
+
+# Open archives of this process: {path: (pid, archive)}; not shared across fork
+_ARCHIVES = {}
+
+
+def _open_archive(path):
+    cached = _ARCHIVES.get(path)
+    if cached is not None and cached[0] == os.getpid():
+        return cached[1]
+    if path.endswith('.zip'):
+        archive = zipfile.ZipFile(path)
+    else:
+        archive = tarfile.open(path, 'r:*')
+    _ARCHIVES[path] = (os.getpid(), archive)
+    return archive
+
+
+def list_archive(path):
+    """Return sorted (device, member path) pairs for the configs in a snapshot archive."""
+    archive = _open_archive(path)
+    if isinstance(archive, zipfile.ZipFile):
+        names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    else:
+        names = [member.name for member in archive.getmembers() if member.isfile()]
+
+    configs = [(device_name(name), f"{path}{MEMBER_SEP}{name}")
+               for name in names if config_suffix(os.path.basename(name))]
+    return sorted(configs)
+
+
+@contextmanager
+def open_config(path):
+    """Open a device config (plain, compressed or archive member) as a binary stream."""
+    archive_path, member = split_member(path)
+    with ExitStack() as stack:
+        if member is None:
+            raw = stack.enter_context(open(path, 'rb'))
+        else:
+            archive = _open_archive(archive_path)
+            if isinstance(archive, zipfile.ZipFile):
+                raw = stack.enter_context(archive.open(member))
+            else:
+                raw = stack.enter_context(archive.extractfile(member))
+        reader = CONFIG_READERS.get(config_suffix(member or path), CONFIG_READERS['.cfg'])
+        stream = reader(raw)
+        if stream is not raw:
+            stack.enter_context(stream)
+        yield stream
+
+
+def read_config_bytes(path):
+    """Whole decompressed content of a device config."""
+    with open_config(path) as f:
+        return f.read()
+
+
+def config_digest(path):
+    """SHA-1 of a device config's decompressed content, read in chunks.
+
+    Equal to file_digest() for plain ``.cfg`` files.
+    """
+    with open_config(path) as f:
+        return _sha1(f)
+
+
+def file_digest(path):
+    """SHA-1 of a file's bytes as stored, read in chunks."""
+    with open(path, 'rb') as f:
+        return _sha1(f)
+
+
+def _sha1(f):
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: f.read(1 << 20), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_stat(path):
+    """os.stat() of the file holding a config (the archive for archive members)."""
+    return os.stat(split_member(path)[0])
@@ -0,0 +1,102 @@
+"""
+Content-addressed, deduplicated storage for device snapshots.
+
+Most device configs are byte-identical from one snapshot to the next. The
+ingest step stores each config once under ``<snapshots>/.store/objects/``,
+named by the SHA-1 of its content, and turns the timestamp directory into a
+small ``manifest.json`` (device -> digest) or into hardlinks to the blobs.
+collect_device_configs() resolves either layout back to readable paths.
+"""
+import os
+import json
+import shutil
+
+from tests.common.snapshot_readers import file_digest
+
+STORE_DIR = '.store'
+MANIFEST_NAME = 'manifest.json'
+INGEST_MODES = ('manifest', 'hardlink')
+
+
+def store_dir(snapshots_base):
+    """Blob store shared by all snapshots under ``snapshots_base``."""
+    return os.path.join(snapshots_base, STORE_DIR)
+
+
+def blob_path(store, digest):
+    """Path of the blob with ``digest``, fanned out on its first two hex digits."""
+    return os.path.join(store, 'objects', digest[:2], digest[2:])
+
+
+def store_blob(store, path):
+    """Copy ``path`` into the store unless its content is already there.
+
+    Returns (digest, True if a new blob was written).
+    """
+    digest = file_digest(path)
+    target = blob_path(store, digest)
+    if os.path.exists(target):
+        return digest, False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_file = f"{target}.{os.getpid()}.tmp"
+    shutil.copyfile(path, tmp_file)
+    os.replace(tmp_file, target)
+    return digest, True
+
+
+def read_manifest(snapshot_dir):
+    """Return {device: digest} of a manifest snapshot, or None for a plain directory."""
+    manifest_file = os.path.join(snapshot_dir, MANIFEST_NAME)
+    if not os.path.isfile(manifest_file):
+        return None
+    with open(manifest_file) as f:
+        return json.load(f)['devices']
+
+
+def resolve_manifest(snapshot_dir, manifest):
+    """Map each device of a manifest to its blob path, sorted by device."""
+    store = store_dir(os.path.dirname(os.path.abspath(snapshot_dir)))
+    return [(device, blob_path(store, manifest[device])) for device in sorted(manifest)]
+
+
+def ingest_snapshot(source_dir, snapshots_base, timestamp=None, mode='manifest'):
+    """Store the .cfg files of ``source_dir`` as snapshot ``timestamp``.
+
+    Returns (snapshot_dir, device count, number of newly stored blobs). The
+    snapshot is assembled in a hidden directory and renamed into place, so
+    readers never see a partial snapshot.
+    """
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode '{mode}', expected one of {INGEST_MODES}")
+
+    timestamp = timestamp or os.path.basename(os.path.normpath(source_dir))
+    snapshot_dir = os.path.join(snapshots_base, timestamp)
+    if os.path.exists(snapshot_dir):
+        raise FileExistsError(f"Snapshot '{snapshot_dir}' already exists")
+
+    store = store_dir(snapshots_base)
+    tmp_dir = os.path.join(snapshots_base, f".{timestamp}.{os.getpid()}.tmp")
+    os.makedirs(tmp_dir)
+
+    manifest = {}
+    new_blobs = 0
+    try:
+        for filename in sorted(os.listdir(source_dir)):
+            path = os.path.join(source_dir, filename)
+            if not filename.endswith('.cfg') or not os.path.isfile(path):
+                continue
+            digest, stored = store_blob(store, path)
+            new_blobs += stored
+            manifest[filename[:-4]] = digest
+            if mode == 'hardlink':
+                os.link(blob_path(store, digest), os.path.join(tmp_dir, filename))
+
+        if mode == 'manifest':
+            with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+                json.dump({'devices': manifest}, f, indent=1, sort_keys=True)
+
+        os.rename(tmp_dir, snapshot_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return snapshot_dir, len(manifest), new_blobs
@@ -0,0 +1,98 @@
+"""
+Placeholders in golden fragments.
+
+A fragment may contain placeholders instead of site-specific values:
+
+- ``{{name}}`` matches one whitespace-free token, captured as ``name``
+- ``{{name:REGEX}}`` matches REGEX, captured as ``name``
+- ``{{*}}`` matches anything within the line, uncaptured
+
+A variable used twice must have the same value both times. Everything
+outside placeholders is matched literally and case-insensitively, like
+plain fragments. The longest literal run of a template is its anchor: the
+fragment matcher searches for the anchor with all other fragments and only
+runs the template regex on configs that contain it.
+"""
+import re
+from functools import lru_cache
+
+# {{name}}, {{name:REGEX}} or {{*}}; a REGEX may itself end in '}' ({{n:\d{1,3}}})
+PLACEHOLDER = re.compile(r'\{\{\s*(\*|[A-Za-z_]\w*)(?::(.*?))?\s*\}\}(?!\})')
+
+DEFAULT_VALUE = r'\S+'
+
+
+def is_template(content):
+    """True if ``content`` contains at least one placeholder."""
+    return '{{' in content and PLACEHOLDER.search(content) is not None
+
+
+def template_source(content, newline=r'\n'):
+    """Regex source of a template; literal line breaks become ``newline``."""
+    parts = []
+    seen = set()
+    pos = 0
+    for placeholder in PLACEHOLDER.finditer(content):
+        parts.append(_literal(content[pos:placeholder.start()], newline))
+        name, regex = placeholder.group(1), placeholder.group(2)
+        if name == '*':
+            parts.append(r'[^\r\n]*?')
+        elif name in seen:
+            parts.append(f'(?P={name})')
+        else:
+            seen.add(name)
+            parts.append(f'(?P<{name}>{regex or DEFAULT_VALUE})')
+        pos = placeholder.end()
+    parts.append(_literal(content[pos:], newline))
+    return ''.join(parts)
+
+
+def _literal(text, newline):
+    return newline.join(re.escape(line) for line in text.split('\n'))
+
+
+def compile_template(content, name='template'):
+    """Compile a template for case-insensitive search of config text.
+
+    Raises ValueError naming the fragment when a placeholder regex is invalid.
+    """
+    try:
+        return re.compile(template_source(content), re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"Invalid placeholder in template '{name}': {e}") from None
+
+
+def compile_byte_template(content):
+    """Like compile_template(), for raw config bytes with LF or CRLF line endings."""
+    return re.compile(template_source(content, r'\r?\n').encode(), re.IGNORECASE)
+
+
+@lru_cache(maxsize=None)
+def cached_template(content):
+    """compile_template() cached per content, for per-node and per-banner matching."""
+    return compile_template(content)
+
+
+def literal_anchor(content):
+    """Longest literal run of a template, lowercased; '' if it is all placeholders.
+
+    Runs are cut at placeholders and line breaks, so the anchor is always
+    found within one config line.
+    """
+    runs = [run.strip() for literal in PLACEHOLDER.split(content)[::3] for run in literal.split('\n')]
+    return max(runs, key=len, default='').lower()
+
+
+def variables(match):
+    """{name: value} captured by a template match, values decoded from bytes if needed."""
+    return {
+        name: value.decode('utf-8', errors='ignore') if isinstance(value, bytes) else value
+        for name, value in match.groupdict().items()
+    }
+
+
+def format_variables(captured):
+    """Result detail suffix listing captured variables, e.g. ' (site=nyc1)'; '' if none."""
+    if not captured:
+        return ''
+    return ' (' + ', '.join(f"{name}={value}" for name, value in captured.items()) + ')'
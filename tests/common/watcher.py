@@ -0,0 +1,119 @@
+"""
+Long-running watch mode (``cfg_drift.py watch``).
+
+Polls the snapshots directory and checks every snapshot that arrives after
+the watcher started, keeping the compiled golden templates and the results
+of the previous snapshot in memory. Devices whose config content is
+unchanged since the previous snapshot reuse its results, with timestamps
+and config paths updated; only changed and new devices are evaluated.
+Edits to the expected or forbidden fragments reload the templates and
+re-check the latest snapshot in full.
+"""
+import time
+from collections import Counter
+
+from tests.common.config_utils import list_snapshots, collect_device_configs, new_run_id, ResultSink
+from tests.common.engine import ComplianceEngine, _record
+from tests.common.golden_bundle import fragment_signature
+from tests.common.result_cache import rebase_results
+from tests.common.snapshot_readers import config_digest
+
+
+class SnapshotWatcher:
+    """Checks new snapshots incrementally against hot golden templates."""
+
+    def __init__(self, test_config, log=print):
+        self.test_config = test_config
+        self.workers = test_config['workers']
+        self.log = log
+        # Last checked snapshot name and its {device: (content digest, config path, results)}
+        self.snapshot = None
+        self.results = {}
+        self.reload_templates()
+
+    def reload_templates(self):
+        """(Re)compile the golden templates.
+
+        Results computed with the old templates are dropped, so the next poll
+        re-checks the latest snapshot in full.
+        """
+        self.signature = fragment_signature(self.test_config['expected_dir'], self.test_config['forbidden_dir'])
+        self.engine = ComplianceEngine(self.test_config)
+        self.snapshot = None
+        self.results = {}
+
+    def templates_changed(self):
+        signature = fragment_signature(self.test_config['expected_dir'], self.test_config['forbidden_dir'])
+        return signature != self.signature
+
+    def pending(self):
+        """Snapshots newer than the last checked one, oldest first: [(name, path)]."""
+        # Refreshes the snapshot catalog, when there is one
+        snapshots = list_snapshots(self.test_config['snapshots_base'])
+        if self.snapshot is None:
+            # Start from the most recent snapshot, not the whole history
+            return [max(snapshots.items())] if snapshots else []
+        return [(name, path) for name, path in snapshots.items() if name > self.snapshot]
+
+    def check(self, name, snapshot_dir):
+        """Check one snapshot, evaluating only devices whose content changed.
+
+        Returns (status_counts, failures, evaluated devices).
+        """
+        device_configs = collect_device_configs(snapshot_dir)
+        digests = {device: config_digest(path) for device, path in device_configs}
+
+        paths = dict(device_configs)
+        results = {}
+        changed = []
+        for device, path in device_configs:
+            previous = self.results.get(device)
+            if previous is not None and previous[0] == digests[device]:
+                # Same content: reuse the verdicts, restamped for this snapshot's file
+                results[device] = (digests[device], path, rebase_results(previous[2], previous[1], path))
+            else:
+                changed.append((device, path))
+        for device, device_results in self.engine.iter_results(changed, self.workers):
+            results[device] = (digests[device], paths[device], device_results)
+        # Results are kept here; nothing the engine cached per device is needed again
+        self.engine.clear()
+
+        sink = None
+        if self.test_config['csv_output']:
+            # One report per snapshot; several may be checked within the same second
+            sink = ResultSink(self.test_config['results_dir'], f"{new_run_id()}_{name.replace(':', '-')}")
+        status_counts = Counter()
+        failures = []
+        for device, _ in device_configs:
+            _record(results[device][2], sink, status_counts, failures)
+        csv_file = sink.close() if sink else None
+
+        self.snapshot = name
+        self.results = results
+
+        passed = status_counts['PASS']
+        self.log(f"# {snapshot_dir}: {len(device_configs)} devices, {len(changed)} re-evaluated, "
+                 f"{passed} passed, {sum(status_counts.values()) - passed} failed")
+        for failure in failures:
+            self.log(f"FAILED {failure}")
+        if csv_file:
+            self.log(f"# CSV report: {csv_file}")
+        return status_counts, failures, len(changed)
+
+    def poll(self):
+        """Reload templates if they changed, then check new snapshots; returns snapshots checked."""
+        checked = 0
+        if self.templates_changed():
+            self.log("# Golden templates changed, reloading")
+            self.reload_templates()
+
+        for name, path in self.pending():
+            self.check(name, path)
+            checked += 1
+        return checked
+
+    def run(self, interval=30.0):
+        """Poll every ``interval`` seconds until interrupted."""
+        while True:
+            self.poll()
+            time.sleep(interval)